@@ -0,0 +1,30 @@
+import pytest
+from core.query_budget import query_budget as _query_budget
+from posts.models import Comment, Follow, Post
+
+
+@pytest.fixture
+def enforce_query_budgets(settings):
+    """View с @query_budget падают при превышении бюджета."""
+    settings.QUERY_BUDGET_ENFORCE = True
+
+
+@pytest.fixture
+def query_budget():
+    """Контекстный менеджер для проверки бюджета произвольного блока."""
+    return _query_budget
+
+
+@pytest.fixture(params=[10, 1000, 100000], ids=lambda count: f'{count}_posts')
+def posts_at_scale(request, user, another_user, group):
+    """Заполняет базу постами с подпиской и комментариями, возвращает пост."""
+    Post.objects.bulk_create(
+        Post(text=f'Пост {i}', author=another_user, group=group)
+        for i in range(request.param)
+    )
+    Follow.objects.create(user=user, author=another_user)
+    post = Post.objects.create(text='Обсуждаемый пост', author=another_user, group=group)
+    Comment.objects.bulk_create(
+        Comment(post=post, author=user, text=f'Комментарий {i}') for i in range(10)
+    )
+    return post
@@ -0,0 +1,46 @@
+import pytest
+from django.core.cache import cache
+
+from core.query_budget import QueryBudgetExceeded
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestQueryBudget:
+
+    def test_budget_exceeded(self, query_budget, post):
+        with pytest.raises(QueryBudgetExceeded):
+            with query_budget(1, enforce=True):
+                list(post.author.post.all())
+                list(post.author.comments.all())
+
+    def test_budget_respected(self, query_budget, post):
+        with query_budget(1, enforce=True) as budget:
+            list(post.author.post.all())
+        assert len(budget.queries) == 1
+
+    @pytest.mark.parametrize('cold_cache', [True, False], ids=['cold', 'warm'])
+    def test_views_within_budget(self, enforce_query_budgets, user_client,
+                                 posts_at_scale, cold_cache):
+        post = posts_at_scale
+        urls = [
+            '/',
+            '/?page=2',
+            f'/group/{post.group.slug}/',
+            f'/profile/{post.author.username}/',
+            f'/posts/{post.id}/',
+            '/follow/',
+        ]
+        for url in urls:
+            if cold_cache:
+                cache.clear()
+            else:
+                user_client.get(url)
+            try:
+                response = user_client.get(url)
+            except QueryBudgetExceeded as e:
+                assert False, f'Страница `{url}` превысила бюджет запросов: {e}'
+            assert response.status_code == 200
+            page = response.context.get('page_obj')
+            if page is not None and url != '/?page=2':
+                assert page.next_cursor, f'Страница `{url}` должна вести дальше'
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from core.metrics import counter_totals, histogram_totals, worst_requests
+
+MIB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = ('Показывает view с наибольшим пиком памяти запроса по данным '
+            'MEMORY_TRACING и места выделения в худшем запросе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Сколько view показать.')
+        parser.add_argument(
+            '--sites', type=int, default=5,
+            help='Сколько мест выделения показать для каждого view.')
+
+    def handle(self, *args, **options):
+        peaks = histogram_totals('memory_peak_bytes')
+        exceeded = counter_totals('memory_budget_exceeded_total')
+        worst = worst_requests()
+        rows = [
+            (view, count, total, worst[view])
+            for view, (count, total) in peaks.items()
+            if count and view in worst
+        ]
+        if not rows:
+            self.stdout.write(
+                'Данных нет: включите MEMORY_TRACING и дождитесь запросов.')
+            return
+        rows.sort(key=lambda row: row[3]['peak'], reverse=True)
+        for view, count, total, entry in rows[:options['limit']]:
+            self.stdout.write(
+                f'{view}: худший пик {entry["peak"] / MIB:.1f} MiB '
+                f'({entry["path"]}), средний {total / count / MIB:.1f} MiB '
+                f'за {count} запросов, сверх бюджета {exceeded.get(view, 0)}')
+            for site in entry['sites'][:options['sites']]:
+                self.stdout.write(
+                    f'    {site["site"]}: {site["size"] / 1024:.1f} KiB, '
+                    f'блоков {site["count"]}')
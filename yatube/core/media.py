@@ -0,0 +1,162 @@
+"""Раздача загруженных файлов из MEDIA_ROOT.
+
+Сам файл по возможности отдаёт фронтовой веб-сервер: с MEDIA_SENDFILE
+view только проверяет путь и заголовки и отвечает X-Accel-Redirect (nginx)
+или X-Sendfile (Apache, lighttpd). Без него файл потоково отдаёт
+FileResponse с поддержкой Range, If-None-Match и If-Modified-Since.
+
+Имена картинок постов и миниатюр sorl — хэши содержимого, поэтому такие
+файлы никогда не меняются и кэшируются клиентом навсегда (immutable).
+"""
+import mimetypes
+import os
+import re
+from stat import S_ISREG
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Варианты миниатюр; в mimetypes старых версий Python их типов нет.
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+
+class RangeFile:
+    """Часть открытого файла, которую FileResponse читает как файл.
+
+    Атрибута name нет намеренно: по нему FileResponse выставил бы
+    Content-Length всего файла.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """(начало, длина) запрошенного диапазона, None — отдать файл целиком,
+    False — диапазон за пределами файла.
+
+    Несколько диапазонов в одном запросе не поддерживаются: на них
+    отвечаем всем файлом, как разрешает RFC 7233.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or match.group(0) == 'bytes=-':
+        return None
+    first, last = match.groups()
+    if not first:
+        length = min(int(last), size)
+        return (size - length, length) if length else False
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end - start + 1
+
+
+def range_applies(request, etag, mtime):
+    """If-Range: диапазон отдаётся, только если валидатор строго
+    совпадает с текущим (RFC 7233, 3.2). Слабый ETag и дата, отличная от
+    Last-Modified, получают весь файл: склеенный из частей разных версий
+    файл клиент не отличит от целого.
+    """
+    if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+    if not if_range:
+        return True
+    if if_range.startswith('W/'):
+        return False
+    if if_range.startswith('"'):
+        return not etag.startswith('W/') and if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and date == int(mtime)
+
+
+def cache_control(path):
+    if re.match(settings.MEDIA_IMMUTABLE_RE, path):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_MAX_AGE}'
+
+
+def sendfile_response(path, full_path):
+    response = HttpResponse()
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + path)
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def file_response(request, full_path, size, etag, mtime):
+    file = open(full_path, 'rb')
+    requested = None
+    if 'HTTP_RANGE' in request.META and range_applies(request, etag, mtime):
+        requested = parse_range(request.META['HTTP_RANGE'], size)
+    if requested is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if requested is None:
+        return FileResponse(file)
+    start, length = requested
+    response = FileResponse(RangeFile(file, start, length), status=206)
+    response['Content-Range'] = (
+        f'bytes {start}-{start + length - 1}/{size}')
+    response['Content-Length'] = length
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Файл из MEDIA_ROOT с заголовками кэширования."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not S_ISREG(stat.st_mode):
+        raise Http404
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        if settings.MEDIA_SENDFILE:
+            response = sendfile_response(path, full_path)
+        else:
+            response = file_response(
+                request, full_path, stat.st_size, etag, stat.st_mtime)
+    if response.status_code != 304:
+        content_type, encoding = mimetypes.guess_type(full_path)
+        response['Content-Type'] = (
+            content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control(path)
+    response['Accept-Ranges'] = 'bytes'
+    return response
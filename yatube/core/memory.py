@@ -0,0 +1,84 @@
+"""Учёт памяти запросов через tracemalloc.
+
+С MEMORY_TRACING MetricsMiddleware перед каждым запросом сбрасывает
+трассы tracemalloc, а после него берёт пик выделенной памяти и места,
+где выделено больше всего из того, что ещё живо к концу запроса. Пик
+попадает в гистограмму /metrics, а худший запрос каждого view со
+своими местами выделения — в файл метрик процесса (core.metrics), откуда
+его читает команда memory_report.
+Запрос дороже MEMORY_BUDGET байт отмечается в логе yatube.memory и
+счётчиком memory_budget_exceeded_total.
+
+tracemalloc общий на процесс, поэтому числа точны для воркеров, которые
+обслуживают по одному запросу (prefork), и приблизительны для потоков.
+Трассировка замедляет процесс в разы: включайте её на время поиска.
+"""
+import logging
+import time
+import tracemalloc
+
+from django.conf import settings
+
+logger = logging.getLogger('yatube.memory')
+
+# Выделения самой трассировки и импорта — не забота запроса.
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def begin():
+    """Начинает трассировку запроса; False, если она выключена."""
+    if not settings.MEMORY_TRACING:
+        return False
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+    tracemalloc.clear_traces()
+    return True
+
+
+def top_sites(limit):
+    snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+    return [
+        {
+            'site': f'{stat.traceback[0].filename}:'
+                    f'{stat.traceback[0].lineno}',
+            'size': stat.size,
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics('lineno')[:limit]
+    ]
+
+
+def finish():
+    """Пик памяти запроса в байтах и главные места выделения."""
+    _, peak = tracemalloc.get_traced_memory()
+    return peak, top_sites(settings.MEMORY_TOP_SITES)
+
+
+def over_budget(peak):
+    budget = settings.MEMORY_BUDGET
+    return budget is not None and peak > budget
+
+
+def worst_entry(path, peak, sites):
+    """Запись о запросе для memory_report."""
+    return {
+        'peak': peak,
+        'path': path,
+        'sites': sites,
+        'time': time.time(),
+    }
+
+
+def account(view, path, peak, sites):
+    if over_budget(peak):
+        logger.warning(
+            '%s %s: пик памяти %d байт при бюджете %d:\n%s',
+            view, path, peak, settings.MEMORY_BUDGET,
+            '\n'.join(
+                '{site}: {size} байт, блоков {count}'.format(**site)
+                for site in sites))
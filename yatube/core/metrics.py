@@ -0,0 +1,439 @@
+"""Метрики запросов: Server-Timing и /metrics в формате Prometheus.
+
+MetricsMiddleware меряет каждый запрос — число и время SQL-запросов,
+время рендеринга шаблонов, попадания и промахи кэша, размер ответа и
+полное время — и подписывает их именем view (posts:index, ...).
+
+Процесс копит значения у себя и раз в METRICS_FLUSH_INTERVAL секунд
+целиком переписывает свой файл в METRICS_DIR, а /metrics складывает
+файлы всех процессов — так же, как multiprocess-режим клиента
+Prometheus. Кэш для этого не годится: LocMemCache у каждого воркера
+свой. Каждый процесс пишет только свой файл, поэтому одновременные
+записи воркеров ничего не теряют. Файлы завершившихся процессов
+остаются в сумме; каталог очищают при перезапуске сервиса. Там же
+лежат счётчики count() (попадания кэша фрагментов для cache_stats) и
+худшие по памяти запросы для memory_report: команды запускаются
+отдельным процессом и иначе их бы не увидели.
+Времена хранятся целыми микросекундами.
+С MEMORY_TRACING к ним добавляется пик памяти запроса (core.memory).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+from django.urls import Resolver404, resolve
+from django.utils.crypto import constant_time_compare
+
+from . import memory, slow_queries
+
+# Границы корзин гистограмм: секунды и байты.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MEMORY_BUCKETS = tuple(2 ** power * 1024 * 1024 for power in range(9))
+HISTOGRAMS = {
+    'request_duration_seconds': ('Время обработки запроса.', BUCKETS),
+    'db_duration_seconds': ('Время SQL-запросов за запрос.', BUCKETS),
+    'template_duration_seconds': (
+        'Время рендеринга шаблонов за запрос.', BUCKETS),
+    'memory_peak_bytes': (
+        'Пик памяти запроса по tracemalloc.', MEMORY_BUCKETS),
+}
+COUNTERS = {
+    'db_queries_total': 'SQL-запросы.',
+    'cache_hits_total': 'Попадания в кэш страниц и фрагментов.',
+    'cache_misses_total': 'Промахи кэша страниц и фрагментов.',
+    'response_bytes_total': 'Размер ответов в байтах.',
+    'memory_budget_exceeded_total': 'Запросы дороже MEMORY_BUDGET.',
+}
+PREFIX = 'yatube_'
+
+_local = threading.local()
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_totals = defaultdict(int)
+_views = set()
+_worst = {}
+_changed = False
+_process = None
+_last_flush = time.monotonic()
+
+
+class RequestStats:
+    def __init__(self, request):
+        self.request = request
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.memory_peak = None
+        self.memory_sites = None
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.db_time += duration
+            self.queries += 1
+            if slow_queries.is_slow(duration):
+                slow_queries.record(sql, duration, view_name(self.request))
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
+
+
+def record_cache(hit):
+    """Отмечает попадание или промах кэша в метриках текущего запроса."""
+    stats = current_stats()
+    if stats is None:
+        return
+    if hit:
+        stats.cache_hits += 1
+    else:
+        stats.cache_misses += 1
+
+
+class InstrumentedTemplate:
+    """Шаблон, который прибавляет время рендеринга к метрикам запроса.
+
+    Вложенные рендеринги (render_to_string внутри тега) не считаются
+    второй раз: время меряет самый внешний.
+    """
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        stats = current_stats()
+        if stats is None:
+            return self._template.render(context, request)
+        stats.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - start
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """Бэкенд DjangoTemplates с замером времени рендеринга."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Ответ из кэша страниц отдаётся до разрешения URL.
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unresolved'
+    if not match.url_name:
+        return match._func_path
+    # Имя приложения, а не экземпляра: posts:index, хотя пространство
+    # имён в корневом urls.py называется post.
+    return ':'.join((*match.app_names, match.url_name))
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length', 0))
+    return len(response.content)
+
+
+def _key(metric, view, suffix=''):
+    return f'{metric}:{view}:{suffix}'
+
+
+def scale(metric):
+    """Множитель суммы гистограммы до целого: секунды — в микросекунды."""
+    return 1_000_000 if metric.endswith('_seconds') else 1
+
+
+def _process_file():
+    """Имя файла процесса. Вызывается под _lock перед каждым изменением:
+    процесс, ответвлённый fork() от другого, начинает с нуля, ведь
+    унаследованное уже лежит в файле родителя."""
+    global _process, _changed
+    pid = os.getpid()
+    if _process is None or _process[0] != pid:
+        if _process is not None:
+            _totals.clear()
+            _views.clear()
+            _worst.clear()
+        _process = (pid, f'{pid}-{uuid.uuid4().hex}.json')
+    _changed = True
+    return _process[1]
+
+
+def observe(metric, view, value):
+    for bound in HISTOGRAMS[metric][1]:
+        if value <= bound:
+            _totals[_key(metric, view, bound)] += 1
+            break
+    else:
+        _totals[_key(metric, view, '+Inf')] += 1
+    _totals[_key(metric, view, 'sum')] += int(value * scale(metric))
+
+
+def record_request(view, stats, duration, size):
+    with _lock:
+        _process_file()
+        _views.add(view)
+        observe('request_duration_seconds', view, duration)
+        observe('db_duration_seconds', view, stats.db_time)
+        observe('template_duration_seconds', view, stats.template_time)
+        _totals[_key('db_queries_total', view)] += stats.queries
+        _totals[_key('cache_hits_total', view)] += stats.cache_hits
+        _totals[_key('cache_misses_total', view)] += stats.cache_misses
+        _totals[_key('response_bytes_total', view)] += size
+        if stats.memory_peak is not None:
+            observe('memory_peak_bytes', view, stats.memory_peak)
+            _totals[_key('memory_budget_exceeded_total', view)] += (
+                memory.over_budget(stats.memory_peak))
+            worst = _worst.get(view)
+            if worst is None or worst['peak'] < stats.memory_peak:
+                _worst[view] = memory.worst_entry(
+                    stats.request.path, stats.memory_peak,
+                    stats.memory_sites)
+
+
+def count(name, delta=1):
+    """Прибавляет к счётчику процесса вне гистограмм по view, например к
+    попаданиям кэша фрагмента; суммы всех процессов дают totals()."""
+    with _lock:
+        _process_file()
+        _totals[name] += delta
+
+
+def flush(force=False):
+    """Переписывает файл процесса в METRICS_DIR, если с прошлого раза
+    что-то изменилось."""
+    global _last_flush, _changed
+    with _flush_lock:
+        with _lock:
+            now = time.monotonic()
+            if not force and (
+                    now - _last_flush < settings.METRICS_FLUSH_INTERVAL):
+                return
+            _last_flush = now
+            if not _changed:
+                return
+            _changed = False
+            name = _process[1]
+            snapshot = json.dumps({
+                'counters': _totals,
+                'views': sorted(_views),
+                'worst': _worst,
+            })
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, name)
+        # Читатель видит либо прежний файл, либо новый целиком.
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            file.write(snapshot)
+        os.replace(path + '.tmp', path)
+
+
+def reset():
+    """Забывает накопленное процессом, не трогая файлы; для тестов."""
+    global _process, _changed
+    with _lock:
+        _totals.clear()
+        _views.clear()
+        _worst.clear()
+        _process = None
+        _changed = False
+
+
+def snapshots():
+    """Содержимое файлов всех процессов, включая текущий."""
+    flush(force=True)
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        return []
+    result = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(settings.METRICS_DIR, name),
+                      encoding='utf-8') as file:
+                result.append(json.load(file))
+        except (OSError, ValueError):
+            # Файл удалили или он не из этого формата.
+            continue
+    return result
+
+
+def collect():
+    """Суммы счётчиков всех процессов, все известные view и худший по
+    памяти запрос каждого view среди всех процессов."""
+    totals = defaultdict(int)
+    views = set()
+    worst = {}
+    for snapshot in snapshots():
+        for key, value in snapshot['counters'].items():
+            totals[key] += value
+        views.update(snapshot['views'])
+        for view, entry in snapshot['worst'].items():
+            if view not in worst or worst[view]['peak'] < entry['peak']:
+                worst[view] = entry
+    return totals, sorted(views), worst
+
+
+def totals(*names):
+    """Суммы счётчиков count() по всем процессам."""
+    values = collect()[0]
+    return {name: values[name] for name in names}
+
+
+def worst_requests():
+    """{view: худший по памяти запрос} по всем процессам."""
+    return collect()[2]
+
+
+def server_timing(stats, duration):
+    parts = [
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} SQL"',
+        f'tpl;dur={stats.template_time * 1000:.1f}',
+        f'cache;desc="hits {stats.cache_hits}, '
+        f'misses {stats.cache_misses}"',
+        f'total;dur={duration * 1000:.1f}',
+    ]
+    if stats.memory_peak is not None:
+        parts.append(
+            f'mem;desc="peak {stats.memory_peak / 1024 / 1024:.1f} MiB"')
+    return ', '.join(parts)
+
+
+class MetricsMiddleware:
+    """Меряет запрос целиком, поэтому стоит первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats(request)
+        tracing = memory.begin()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query))
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+        duration = time.perf_counter() - start
+        view = view_name(request)
+        if tracing:
+            stats.memory_peak, stats.memory_sites = memory.finish()
+            memory.account(
+                view, request.path, stats.memory_peak, stats.memory_sites)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = server_timing(stats, duration)
+        record_request(view, stats, duration, response_size(response))
+        flush()
+        return response
+
+
+def _labels(view, **extra):
+    labels = {'view': view, **extra}
+    return ','.join(
+        '{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels.items())
+
+
+def known_views():
+    return collect()[1]
+
+
+def histogram_totals(metric):
+    """(число наблюдений, сумма) гистограммы по каждому view."""
+    values, views, _ = collect()
+    buckets = (*HISTOGRAMS[metric][1], '+Inf')
+    return {
+        view: (
+            sum(values[_key(metric, view, bound)] for bound in buckets),
+            values[_key(metric, view, 'sum')] / scale(metric),
+        )
+        for view in views
+    }
+
+
+def counter_totals(metric):
+    values, views, _ = collect()
+    return {view: values[_key(metric, view)] for view in views}
+
+
+def render_metrics():
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    values, views, _ = collect()
+    lines = []
+    for metric, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {PREFIX}{metric} {help_text}',
+                  f'# TYPE {PREFIX}{metric} histogram']
+        for view in views:
+            total = 0
+            for bound in (*buckets, '+Inf'):
+                total += values[_key(metric, view, bound)]
+                lines.append('{}{}_bucket{{{}}} {}'.format(
+                    PREFIX, metric, _labels(view, le=str(bound)), total))
+            value = values[_key(metric, view, 'sum')] / scale(metric)
+            lines.append(
+                f'{PREFIX}{metric}_sum{{{_labels(view)}}} {value}')
+            lines.append(
+                f'{PREFIX}{metric}_count{{{_labels(view)}}} {total}')
+    for metric, help_text in COUNTERS.items():
+        lines += [f'# HELP {PREFIX}{metric} {help_text}',
+                  f'# TYPE {PREFIX}{metric} counter']
+        lines += [
+            '{}{}{{{}}} {}'.format(
+                PREFIX, metric, _labels(view),
+                values[_key(metric, view)])
+            for view in views
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+def scraper_authorized(request):
+    """Запрос несёт METRICS_TOKEN в заголовке Authorization.
+
+    Адрес клиента не годится: за прокси все запросы приходят с его
+    адреса, обычно 127.0.0.1.
+    """
+    token = settings.METRICS_TOKEN
+    scheme, _, credentials = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and (
+        constant_time_compare(credentials.strip(), token))
+
+
+def metrics(request):
+    """/metrics для Prometheus с METRICS_TOKEN и для сотрудников."""
+    if not scraper_authorized(request) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4')
@@ -0,0 +1,193 @@
+"""Профилирование запросов на боевом сервере без отладчика.
+
+Сотрудник добавляет к адресу ?profile=1 или заголовок X-Profile: 1, и
+ProfilingMiddleware выполняет этот запрос под cProfile, одновременно
+снимая стеки потока сэмплером. В PROFILE_DIR остаются два файла:
+<имя>.prof для pstats и snakeviz и <имя>.folded со свёрнутыми стеками
+для flamegraph.pl или speedscope. Имя приходит в заголовке ответа
+X-Profile.
+
+С PROFILE_SAMPLING процесс ещё и постоянно сэмплирует потоки, которые
+обрабатывают запросы, раз в PROFILE_SAMPLE_INTERVAL секунд. Стеки
+копятся по view и раз в PROFILE_SAMPLE_WINDOW секунд сбрасываются в
+sampling-<pid>-<время>.folded; корень каждого стека — имя view.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+# Отдельный запрос короткий, поэтому его стеки снимаются чаще.
+REQUEST_SAMPLE_INTERVAL = 0.001
+
+_active = {}
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def frame_label(code):
+    filename = code.co_filename
+    for root in (settings.BASE_DIR, *sys.path):
+        if root and filename.startswith(root + os.sep):
+            filename = os.path.relpath(filename, root)
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse(frame):
+    """Стек кадра от корня в формате свёрнутых стеков: a;b;c."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def write_folded(path, stacks):
+    with open(path, 'w', encoding='utf-8') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
+
+
+class StackSampler(threading.Thread):
+    """Фоновый поток, который раз в interval секунд снимает стеки
+    отслеживаемых потоков и считает одинаковые."""
+
+    def __init__(self, interval, threads):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.threads = threads
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        threads = dict(self.threads)
+        if not threads:
+            return
+        frames = sys._current_frames()
+        with self.lock:
+            for thread_id, root in threads.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[f'{root};{collapse(frame)}'] += 1
+
+    def take(self):
+        with self.lock:
+            stacks, self.stacks = self.stacks, Counter()
+        return stacks
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class WindowSampler(StackSampler):
+    """Непрерывный сэмплер процесса: стеки запросов по view, файл за
+    каждое окно."""
+
+    def __init__(self, interval, window):
+        super().__init__(interval, _active)
+        self.window = window
+        self.window_start = time.monotonic()
+
+    def sample(self):
+        super().sample()
+        if time.monotonic() - self.window_start >= self.window:
+            self.dump()
+
+    def dump(self):
+        self.window_start = time.monotonic()
+        stacks = self.take()
+        if not stacks:
+            return
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = 'sampling-{}-{}.folded'.format(
+            os.getpid(), time.strftime('%Y%m%d-%H%M%S'))
+        write_folded(os.path.join(settings.PROFILE_DIR, name), stacks)
+
+
+def start_sampling():
+    """Запускает непрерывный сэмплер, если он включён и ещё не запущен."""
+    global _sampler
+    if not settings.PROFILE_SAMPLING:
+        return
+    with _sampler_lock:
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = WindowSampler(
+                settings.PROFILE_SAMPLE_INTERVAL,
+                settings.PROFILE_SAMPLE_WINDOW)
+            _sampler.start()
+
+
+def profiled_view(request):
+    """Имя view, если запрос относится к PROFILE_APPS, иначе None."""
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    if not match.app_names or match.app_names[0] not in settings.PROFILE_APPS:
+        return None
+    return ':'.join((*match.app_names, match.url_name or match.func_name))
+
+
+def profile_requested(request):
+    return (
+        request.GET.get(PROFILE_PARAM) == '1'
+        or request.META.get(PROFILE_HEADER) == '1'
+    )
+
+
+class ProfilingMiddleware:
+    """Стоит после AuthenticationMiddleware: включить профилирование
+    может только сотрудник."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        start_sampling()
+
+    def __call__(self, request):
+        requested = profile_requested(request)
+        if not (requested or settings.PROFILE_SAMPLING):
+            return self.get_response(request)
+        view = profiled_view(request)
+        if view is None:
+            return self.get_response(request)
+        thread_id = threading.get_ident()
+        _active[thread_id] = view
+        try:
+            if requested and request.user.is_staff:
+                return self.profile(request, view)
+            return self.get_response(request)
+        finally:
+            _active.pop(thread_id, None)
+
+    def profile(self, request, view):
+        sampler = StackSampler(
+            REQUEST_SAMPLE_INTERVAL, {threading.get_ident(): view})
+        profiler = cProfile.Profile()
+        sampler.start()
+        try:
+            response = profiler.runcall(self.get_response, request)
+        finally:
+            sampler.stop()
+        name = '{:%Y%m%d-%H%M%S-%f}-{}'.format(
+            datetime.now(), view.replace(':', '.'))
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        base = os.path.join(settings.PROFILE_DIR, name)
+        profiler.dump_stats(base + '.prof')
+        write_folded(base + '.folded', sampler.take())
+        response['X-Profile'] = name
+        return response
@@ -0,0 +1,64 @@
+"""Бюджеты SQL-запросов.
+
+query_budget считает запросы внутри блока или view и сверяет их с
+объявленным числом. Бюджет не должен зависеть от объёма данных: если
+страница из 10 постов делает 20 запросов, это N+1, а не нагрузка.
+"""
+import functools
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('yatube.query_budget')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget:
+    """Контекстный менеджер и декоратор view: @query_budget(3).
+
+    При превышении бросает QueryBudgetExceeded, если включён
+    QUERY_BUDGET_ENFORCE или передан enforce=True, иначе пишет
+    предупреждение в лог yatube.query_budget.
+    """
+
+    def __init__(self, limit, enforce=None, name=None):
+        self.limit = limit
+        self.enforce = enforce
+        self.name = name
+        self.queries = []
+
+    def __call__(self, view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with query_budget(
+                    self.limit, self.enforce, self.name or view.__name__):
+                return view(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        self.queries = []
+        self._wrapper = connection.execute_wrapper(self._record)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._wrapper.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None or len(self.queries) <= self.limit:
+            return
+        message = '{}: {} SQL-запросов при бюджете {}:\n{}'.format(
+            self.name or 'блок', len(self.queries), self.limit,
+            '\n'.join(self.queries))
+        enforce = self.enforce
+        if enforce is None:
+            enforce = settings.QUERY_BUDGET_ENFORCE
+        if enforce:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+    def _record(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
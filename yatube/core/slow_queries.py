@@ -0,0 +1,146 @@
+"""Журнал медленных SQL-запросов.
+
+Запрос дольше SLOW_QUERY_THRESHOLD секунд пишется в логгер
+yatube.slow_queries одной JSON-строкой: текст SQL, время, view, а также
+место, откуда он пришёл, — строка шаблона ({{ author.posts.count }})
+и ближайший кадр кода проекта (posts/views.py:42 in index). Логгер
+пишет в SLOW_QUERY_LOG с ротацией, а страница /admin/slow-queries/
+собирает из этих файлов самые дорогие запросы.
+
+Модуль загружается при настройке логирования, до приложений, поэтому
+не импортирует модели и админку.
+"""
+import json
+import logging
+import os
+import re
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.template.base import Node
+
+logger = logging.getLogger('yatube.slow_queries')
+
+# Кадры этих файлов — обвязка замера, а не источник запроса.
+SKIP_FILES = (
+    os.path.join('core', 'metrics.py'),
+    os.path.join('core', 'slow_queries.py'),
+)
+TOP_LIMIT = 50
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+IN_LIST_RE = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной JSON-строкой из extra={'slow_query': {...}}."""
+
+    def format(self, record):
+        data = getattr(record, 'slow_query', None) or {
+            'message': record.getMessage()}
+        return json.dumps(
+            {'time': self.formatTime(record), **data}, ensure_ascii=False)
+
+
+def fingerprint(sql):
+    """Текст запроса без литералов и длины списков IN: одинаковые
+    запросы с разными аргументами попадают в одну строку отчёта."""
+    sql = LITERAL_RE.sub('?', sql)
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def template_origin(frame):
+    """Шаблон и строка узла, который рендерился при запросе."""
+    while frame is not None:
+        # type(), а не isinstance: ленивый объект вроде request.user
+        # вычислился бы и сделал ещё один запрос.
+        node = frame.f_locals.get('self')
+        if issubclass(type(node), Node) and getattr(node, 'token', None):
+            origin = getattr(node, 'origin', None)
+            name = getattr(origin, 'template_name', None) or '<строка>'
+            return f'{name}:{node.token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def code_origin(frame):
+    """Ближайший кадр кода проекта, а не Django и библиотек."""
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(settings.BASE_DIR)
+                and 'site-packages' not in filename
+                and not filename.endswith(SKIP_FILES)):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def is_slow(duration):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    return threshold is not None and duration >= threshold
+
+
+def record(sql, duration, view):
+    frame = sys._getframe(1)
+    logger.warning('slow query', extra={'slow_query': {
+        'sql': sql,
+        'duration_ms': round(duration * 1000, 1),
+        'view': view,
+        'template': template_origin(frame),
+        'frame': code_origin(frame),
+    }})
+
+
+def log_files():
+    path = settings.SLOW_QUERY_LOG
+    backups = [
+        f'{path}.{number}'
+        for number in range(settings.SLOW_QUERY_LOG_BACKUPS, 0, -1)
+    ]
+    return [name for name in (*backups, path) if os.path.exists(name)]
+
+
+def read_records():
+    for name in log_files():
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(data, dict) and 'sql' in data:
+                    yield data
+
+
+def top_offenders(limit=TOP_LIMIT):
+    """Самые дорогие запросы по суммарному времени: запрос с одним и тем
+    же источником считается одной строкой."""
+    groups = defaultdict(lambda: {
+        'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': set()})
+    for data in read_records():
+        key = (
+            fingerprint(data['sql']),
+            data.get('template') or '',
+            data.get('frame') or '',
+        )
+        group = groups[key]
+        group['count'] += 1
+        group['total_ms'] += data.get('duration_ms', 0)
+        group['max_ms'] = max(group['max_ms'], data.get('duration_ms', 0))
+        group['views'].add(data.get('view') or 'unresolved')
+        group['last'] = data.get('time')
+    offenders = [
+        {
+            'sql': sql,
+            'template': template,
+            'frame': frame,
+            **group,
+            'views': sorted(group['views']),
+            'mean_ms': group['total_ms'] / group['count'],
+        }
+        for (sql, template, frame), group in groups.items()
+    ]
+    offenders.sort(key=lambda offender: offender['total_ms'], reverse=True)
+    return offenders[:limit]
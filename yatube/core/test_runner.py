@@ -0,0 +1,25 @@
+"""Запуск тестов manage.py test.
+
+Middleware метрик пишет файл процесса на каждый запрос, поэтому на время
+тестов METRICS_DIR переносится во временный каталог, который потом
+удаляется.
+"""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.metrics_dir = tempfile.mkdtemp()
+        self.metrics_settings = override_settings(
+            METRICS_DIR=self.metrics_dir)
+        self.metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.metrics_settings.disable()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.contrib.admin import site
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from .slow_queries import top_offenders
+
 
 def page_not_found(request, exception):
     return render(
@@ -17,3 +22,14 @@ def server_error(request):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403.html')
+
+
+@staff_member_required
+def slow_queries(request):
+    """Страница админки с самыми дорогими медленными запросами."""
+    return render(request, 'admin/slow_queries.html', {
+        **site.each_context(request),
+        'title': 'Медленные SQL-запросы',
+        'offenders': top_offenders(),
+        'threshold': settings.SLOW_QUERY_THRESHOLD,
+    })
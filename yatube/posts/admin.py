@@ -1,9 +1,154 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models.expressions import RawSQL
 
 from .models import Post, Group, Comment, Follow
+from .paginators import EstimatedCountPaginator, KeysetPaginator
+from .search import match_expression, matching_ids_sql
 
+CURSOR_VAR = 'cursor'
 
-class PostAdmin(admin.ModelAdmin):
+
+class QuerySetPageMixin:
+    """Отдаёт страницу как QuerySet: по нему админка строит формсет
+    list_editable. Строки страницы читаются повторно по первичному ключу.
+    """
+
+    def page(self, number):
+        return self.queryset_page(super().page(number))
+
+    def queryset_page(self, page):
+        if isinstance(page.object_list, list):
+            page.object_list = self.object_list.filter(
+                pk__in=[obj.pk for obj in page.object_list])
+        return page
+
+
+class AdminPaginator(QuerySetPageMixin, EstimatedCountPaginator):
+    pass
+
+
+class CursorPaginator(QuerySetPageMixin, KeysetPaginator,
+                      EstimatedCountPaginator):
+    """Пагинатор админки: страница по курсору, если он передан."""
+
+    def __init__(self, object_list, per_page, cursor=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cursor = cursor
+        self.current_page = None
+
+    def page(self, number):
+        cursor, self.cursor = self.cursor, None
+        if cursor:
+            self.current_page = self.queryset_page(
+                self.get_cursor_page(cursor))
+        else:
+            self.current_page = super().page(number)
+        return self.current_page
+
+
+class CursorChangeList(ChangeList):
+    """Список объектов, который понимает ?cursor= и ссылается на соседние
+    страницы курсором, а не номером: без OFFSET по огромной таблице."""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        if not new_params or CURSOR_VAR not in new_params:
+            remove = [*(remove or []), CURSOR_VAR]
+        return super().get_query_string(new_params, remove)
+
+    def cursor_url(self, name):
+        cursor = getattr(
+            getattr(self.paginator, 'current_page', None), name, None)
+        return cursor and self.get_query_string({CURSOR_VAR: cursor})
+
+    @property
+    def previous_cursor_url(self):
+        return self.cursor_url('previous_cursor')
+
+    @property
+    def next_cursor_url(self):
+        return self.cursor_url('next_cursor')
+
+
+class LoadedAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которое берёт подпись выбранного объекта из связи,
+    уже загруженной select_related, а не запросом на каждую строку."""
+    loaded = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = {
+            str(v) for v in value
+            if str(v) not in self.choices.field.empty_values
+        }
+        if self.loaded is None or selected != {str(self.loaded.pk)}:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        options.append(self.create_option(
+            name, self.loaded.pk,
+            self.choices.field.label_from_instance(self.loaded),
+            selected, len(options)))
+        return [(None, options, 0)]
+
+
+class LoadedRelationsForm(forms.ModelForm):
+    """Форма строки list_editable: отдаёт виджетам автодополнения уже
+    загруженные связанные объекты."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, field in self.fields.items():
+            widget = getattr(field.widget, 'widget', field.widget)
+            if not isinstance(widget, LoadedAutocompleteSelect):
+                continue
+            model_field = self.instance._meta.get_field(name)
+            if model_field.is_cached(self.instance):
+                widget.loaded = getattr(self.instance, name)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Админка для больших таблиц.
+
+    Не считает точный COUNT(*) всей таблицы, а при сортировке по
+    умолчанию листает страницы курсором по (cursor_date_field, id).
+    """
+    cursor_date_field = None
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_changelist_form(self, request, **kwargs):
+        return super().get_changelist_form(
+            request, form=LoadedRelationsForm, **kwargs)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', LoadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        if self.cursor_date_field is None or ORDER_VAR in request.GET:
+            return AdminPaginator(
+                queryset, per_page, orphans, allow_empty_first_page)
+        return CursorPaginator(
+            queryset, per_page, cursor=request.GET.get(CURSOR_VAR),
+            date_field=self.cursor_date_field)
+
+
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -12,27 +157,44 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
+    cursor_date_field = 'pub_date'
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по индексу FTS5 вместо LIKE '%...%' по всей таблице."""
+        if not search_term.strip():
+            return queryset, False
+        if not match_expression(search_term):
+            return queryset.none(), False
+        return queryset.filter(
+            id__in=RawSQL(*matching_ids_sql(search_term))), False
 
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'description')
+    search_fields = ('title', 'slug')
     empty_value_display = '-пусто-'
     prepopulated_fields = {"slug": ("title",)}
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ('pk', 'post', 'author', 'text')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
     list_filter = ('created',)
-    empty_value_display = '-пусто-'
+    ordering = ('-pk',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ('user', 'author',)
     list_editable = ('author',)
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    ordering = ('-pk',)
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,77 @@
+"""Номера версий для инвалидации кэша.
+
+Версия входит в ключ закэшированного фрагмента, поэтому после bump старые
+записи просто перестают читаться и вытесняются сами, а TTL фрагментов
+можно делать сколь угодно длинным.
+"""
+import time
+
+from django.core.cache import cache
+
+from core.metrics import count, record_cache, totals
+
+
+def _key(name):
+    return f'version:{name}'
+
+
+def _initial():
+    # Начинаем с текущего времени, а не с единицы: если счётчик вытеснят
+    # из кэша, новая версия не совпадёт ни с одной из прежних.
+    return int(time.time() * 1000)
+
+
+def get_versions(*names):
+    """Словарь {имя: версия}; отсутствующие версии создаются."""
+    keys = {_key(name): name for name in names}
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, _initial(), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return {name: versions.get(key) for key, name in keys.items()}
+
+
+def get_version(name):
+    return get_versions(name)[name]
+
+
+def bump_versions(*names):
+    for name in names:
+        try:
+            cache.incr(_key(name))
+        except ValueError:
+            cache.add(_key(name), _initial(), None)
+
+
+def get_content_generation():
+    """Поколение контента сайта: меняется при любой записи постов, групп
+    и комментариев."""
+    return get_version('content')
+
+
+def bump_content_generation():
+    bump_versions('content')
+
+
+def record_fragment(name, hit):
+    """Считает попадания и промахи кэша фрагмента.
+
+    Счётчики живут в файлах метрик процессов, а не в кэше: LocMemCache
+    у каждого процесса свой, и команда cache_stats видела бы нули.
+    """
+    record_cache(hit)
+    count(f'fragment:{"hits" if hit else "misses"}:{name}')
+
+
+def fragment_stats(*names):
+    """Словарь {фрагмент: (попадания, промахи)} по всем процессам."""
+    counters = totals(
+        *(f'fragment:{kind}:{name}'
+          for name in names for kind in ('hits', 'misses')))
+    return {
+        name: (counters[f'fragment:hits:{name}'],
+               counters[f'fragment:misses:{name}'])
+        for name in names
+    }
@@ -0,0 +1,106 @@
+"""Материализованная лента подписок (fan-out-on-write).
+
+Запись ленты создаётся для каждого подписчика в момент публикации поста,
+поэтому страница подписок читается одним диапазоном по индексу
+(user, -pub_date, -post) без соединения с таблицей подписок.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .cache import bump_versions, get_version
+from .models import FeedItem, Follow, Post
+
+# Сколько лент обрезает один запрос: число параметров запроса ограничено.
+TRIM_BATCH_SIZE = 500
+
+
+def feed_version(user_id):
+    """Версия ленты для ключа кэша её фрагмента."""
+    return get_version(f'feed:{user_id}')
+
+
+def invalidate_feeds(user_ids):
+    bump_versions(*(f'feed:{user_id}' for user_id in user_ids))
+
+
+def followers(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+
+
+def group_readers(group_id):
+    """Подписчики, в чьих лентах есть посты группы."""
+    return list(FeedItem.objects.filter(post__group_id=group_id).order_by(
+    ).values_list('user_id', flat=True).distinct())
+
+
+def feed_posts(user):
+    """Посты из ленты пользователя с датой и постом записи ленты
+    в feed_date и feed_post: сортировка по ним идёт по индексу ленты."""
+    return Post.objects.filter(feed_items__user=user).annotate(
+        feed_date=F('feed_items__pub_date'),
+        feed_post=F('feed_items__post'),
+    ).order_by('-feed_date', '-feed_post')
+
+
+def trim_feeds(user_ids):
+    """Оставляет в лентах пользователей не более FEED_MAX_LENGTH последних
+    записей: один DELETE с нумерацией записей в окне каждой ленты."""
+    table = FeedItem._meta.db_table
+    for start in range(0, len(user_ids), TRIM_BATCH_SIZE):
+        batch = user_ids[start:start + TRIM_BATCH_SIZE]
+        placeholders = ', '.join(['%s'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {table} WHERE user_id IN ({placeholders})'
+                f') AS ranked WHERE position > %s)',
+                [*batch, settings.FEED_MAX_LENGTH])
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    user_ids = followers(post.author_id)
+    with transaction.atomic():
+        FeedItem.objects.bulk_create(
+            [FeedItem(user_id=user_id, post=post, pub_date=post.pub_date)
+             for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        trim_feeds(user_ids)
+    return user_ids
+
+
+def backfill_follow(follow):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    posts = Post.objects.filter(author_id=follow.author_id).values_list(
+        'id', 'pub_date')[:settings.FEED_MAX_LENGTH]
+    with transaction.atomic():
+        FeedItem.objects.bulk_create(
+            [FeedItem(user_id=follow.user_id, post_id=post_id,
+                      pub_date=pub_date)
+             for post_id, pub_date in posts],
+            ignore_conflicts=True,
+        )
+        trim_feeds([follow.user_id])
+
+
+def remove_follow(follow):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+    FeedItem.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id).delete()
+
+
+def rebuild_feed(user):
+    """Пересобирает ленту пользователя с нуля по таблице подписок."""
+    posts = Post.objects.filter(author__following__user=user).values_list(
+        'id', 'pub_date')[:settings.FEED_MAX_LENGTH]
+    with transaction.atomic():
+        FeedItem.objects.filter(user=user).delete()
+        FeedItem.objects.bulk_create(
+            [FeedItem(user=user, post_id=post_id, pub_date=pub_date)
+             for post_id, pub_date in posts],
+        )
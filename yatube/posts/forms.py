@@ -1,13 +1,46 @@
-from django.forms import ModelForm
+from django.core.files.uploadedfile import UploadedFile
+from django.forms import ModelForm, ValidationError
+from PIL import Image
 
+from .images import normalize_image
 from .models import Post, Comment
 
+# Поля поста, описывающие картинку, когда картинку удалили.
+EMPTY_IMAGE_FIELDS = {
+    'image_width': None,
+    'image_height': None,
+    'image_placeholder': '',
+    'image_formats': '',
+}
+
 
 class PostForm(ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """Новая картинка сохраняется уже нормализованным JPEG, а её
+        размеры и цвет заглушки записываются в пост."""
+        image = self.cleaned_data['image']
+        if image is False:
+            self.set_image_fields(EMPTY_IMAGE_FIELDS)
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            image, metadata = normalize_image(image)
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            # verify() в ImageField не декодирует картинку целиком:
+            # обрезанный файл ломается только при перекодировании.
+            raise ValidationError(
+                'Файл повреждён или это не картинка.', code='invalid_image')
+        self.set_image_fields({**metadata, 'image_formats': ''})
+        return image
+
+    def set_image_fields(self, values):
+        for field, value in values.items():
+            setattr(self.instance, field, value)
+
 
 class CommentForm(ModelForm):
     class Meta:
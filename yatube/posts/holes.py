@@ -0,0 +1,122 @@
+"""Общие страницы с «дырами» для вошедших пользователей.
+
+Страницы вошедших пользователей отличаются только шапкой, кнопкой
+подписки и формой комментария. Шаблон выводит их тегом
+{% hole 'имя' аргумент=значение %}: при обычном рендеринге тег сразу
+вызывает заполнитель из FILLERS, а при рендеринге общей страницы
+оставляет метку и запоминает имя и аргументы. Общая страница со списками
+постов и комментариями кэшируется одна на всех, и на каждый запрос
+заново рендерятся только дыры.
+"""
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .cache import record_fragment
+from .forms import CommentForm
+from .middleware import SKIP_HEADERS, page_url
+from .models import Follow
+
+# Экранированный текст постов не может содержать «<!--», поэтому метка
+# не совпадёт с пользовательским содержимым.
+MARKER = '<!--hole:{}-->'
+MARKER_RE = re.compile(r'<!--hole:(\d+)-->')
+
+FILLERS = {}
+
+
+def filler(name):
+    def register(function):
+        FILLERS[name] = function
+        return function
+    return register
+
+
+@filler('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
+
+
+@filler('follow_button')
+def follow_button(request, author_id, username):
+    user = request.user
+    return render_to_string('posts/includes/follow_button.html', {
+        'author_id': author_id,
+        'username': username,
+        'following': user.is_authenticated and user.pk != author_id and (
+            Follow.objects.filter(user=user, author_id=author_id).exists()),
+    }, request=request)
+
+
+@filler('comment_form')
+def comment_form(request, post_id):
+    return render_to_string('posts/includes/comment_form.html', {
+        'post_id': post_id,
+        'form': CommentForm(),
+    }, request=request)
+
+
+def fill_hole(request, name, args):
+    return mark_safe(FILLERS[name](request, **args))
+
+
+def punch_hole(request, name, args):
+    """Метка дыры на общей странице или сразу её содержимое."""
+    holes = getattr(request, 'page_holes', None)
+    if holes is None:
+        return fill_hole(request, name, args)
+    holes.append((name, args))
+    return mark_safe(MARKER.format(len(holes) - 1))
+
+
+def fill_holes(request, content, holes):
+    return MARKER_RE.sub(
+        lambda match: fill_hole(request, *holes[int(match.group(1))]),
+        content)
+
+
+def shared_applies(request):
+    return (
+        settings.PAGE_CACHE_ENABLED
+        and request.method in ('GET', 'HEAD')
+        and request.user.is_authenticated
+    )
+
+
+def shared_page(view, versions):
+    """view, чья общая часть берётся из кэша, пока не сменились версии
+    ключей страницы."""
+    def page(request, *args, **kwargs):
+        key = f'shared:{page_url(request)}'
+        entry = cache.get(key)
+        record_fragment('shared_page', bool(
+            entry and entry['versions'] == versions))
+        if entry and entry['versions'] == versions:
+            response = HttpResponse(
+                fill_holes(request, entry['content'], entry['holes']))
+            for header, value in entry['headers']:
+                response[header] = value
+            return response
+        request.page_holes = []
+        response = view(request, *args, **kwargs)
+        holes, request.page_holes = request.page_holes, None
+        if response.streaming:
+            return response
+        content = response.content.decode(response.charset)
+        if response.status_code == 200:
+            cache.set(key, {
+                'versions': versions,
+                'content': content,
+                'holes': holes,
+                'headers': [
+                    header for header in response.items()
+                    if header[0].lower() not in SKIP_HEADERS
+                ],
+            }, settings.PAGE_CACHE_TIMEOUT)
+        response.content = fill_holes(request, content, holes)
+        return response
+    return page
@@ -0,0 +1,113 @@
+"""Обработка картинок постов при загрузке.
+
+Оригинал с телефона не хранится: картинка поворачивается по EXIF,
+уменьшается до IMAGE_MAX_SIZE по большей стороне и перекодируется в
+JPEG без метаданных. Для миниатюр, которые выводят шаблоны, пул
+процессов дописывает варианты в современных форматах (WebP, AVIF —
+если их умеет сохранять установленный Pillow).
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# MIME-тип варианта для <source type="...">.
+VARIANT_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+}
+
+
+def variant_formats():
+    """Форматы из IMAGE_VARIANT_FORMATS, которые умеет сохранять Pillow."""
+    Image.init()
+    return [name for name in settings.IMAGE_VARIANT_FORMATS
+            if name.upper() in Image.SAVE]
+
+
+def to_rgb(image):
+    """RGB без альфа-канала: прозрачные участки заливаются белым."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def dominant_color(image):
+    """Средний цвет картинки в виде #rrggbb — фон заглушки."""
+    red, green, blue = to_rgb(image).resize((1, 1), Image.BOX).getpixel(
+        (0, 0))
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def image_metadata(image):
+    """Значения полей Post с размерами и цветом заглушки картинки."""
+    width, height = image.size
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_placeholder': dominant_color(image),
+    }
+
+
+def read_metadata(file):
+    """Размеры и цвет заглушки уже сохранённой картинки.
+
+    Для цвета JPEG декодируется в уменьшенном виде (draft), поэтому
+    большие старые картинки не разворачиваются в память целиком.
+    """
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        image.draft('RGB', (64, 64))
+        metadata = image_metadata(image)
+    metadata.update(image_width=width, image_height=height)
+    return metadata
+
+
+def normalize_image(upload):
+    """Повёрнутый по EXIF, уменьшенный JPEG без метаданных вместо
+    загруженного файла и значения полей Post для него."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image = ImageOps.exif_transpose(image)
+        image = to_rgb(image)
+    max_size = settings.IMAGE_MAX_SIZE
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(
+        buffer, 'JPEG', quality=settings.IMAGE_JPEG_QUALITY,
+        optimize=True, progressive=True)
+    name = os.path.splitext(os.path.basename(upload.name))[0] + '.jpg'
+    return ContentFile(buffer.getvalue(), name=name), image_metadata(image)
+
+
+def variant_name(name, image_format):
+    return f'{os.path.splitext(name)[0]}.{image_format}'
+
+
+def write_variants(name, storage=default_storage):
+    """Сохраняет рядом с картинкой её варианты в современных форматах.
+
+    Имя миниатюры sorl зависит от картинки и параметров, поэтому уже
+    записанный вариант не пересоздаётся. Возвращает форматы вариантов.
+    """
+    formats = variant_formats()
+    missing = [image_format for image_format in formats
+               if not storage.exists(variant_name(name, image_format))]
+    if not missing:
+        return formats
+    with storage.open(name) as source, Image.open(source) as image:
+        image = to_rgb(image)
+    for image_format in missing:
+        buffer = BytesIO()
+        image.save(buffer, image_format.upper(),
+                   quality=settings.IMAGE_VARIANT_QUALITY)
+        storage.save(
+            variant_name(name, image_format), ContentFile(buffer.getvalue()))
+    return formats
@@ -0,0 +1,50 @@
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from posts.images import read_metadata
+from posts.models import Post
+from posts.thumbnails import purge_image_pages
+
+
+class Command(BaseCommand):
+    help = ('Записывает пачками размеры и цвет заглушки картинок постов, '
+            'у которых их ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов читать из базы за один запрос.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True).order_by('pk')
+        filled = skipped = last_id = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_id).values_list(
+                'pk', 'image')[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            names = []
+            for name in {image for _, image in batch}:
+                metadata = self.read(name)
+                if metadata is None:
+                    skipped += 1
+                    continue
+                filled += Post.objects.filter(
+                    pk__in=[pk for pk, _ in batch], image=name,
+                ).update(**metadata)
+                names.append(name)
+            # Страницы с этими постами закэшированы без размеров заглушки.
+            purge_image_pages(*names)
+        self.stdout.write(self.style.SUCCESS(
+            f'Заполнено постов: {filled}, пропущено картинок: {skipped}'))
+
+    def read(self, name):
+        """Метаданные картинки или None, если файла нет или он битый."""
+        try:
+            with default_storage.open(name) as file:
+                return read_metadata(file)
+        except (OSError, SuspiciousFileOperation):
+            return None
@@ -0,0 +1,98 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.utils import timezone
+
+from posts.models import Group, Post, User
+
+# Карточка, как её выводил прежний {% include %} на каждый пост.
+LEGACY_CARD = '''{% load post_images %}
+<ul class="list-group list-group-flush">
+  <li class='list-group-item'>
+    Автор: <a class ='btn btn-outline-primary' href="{% url 'post:profile' post.author.username %}" > {{ post.author.username }} </a>
+  </li>
+  <li class="list-group-item">
+    Дата публикации: {{ post.pub_date|date:"d E Y" }}
+  </li>
+</ul>
+{% if post.image %}
+  {% post_picture post %}
+{% endif %}
+<li class='list-group-item'><p class='list-group-item-info'>{% if post.snippet %}{{ post.snippet|linebreaksbr }}{% else %}{{ post.text|linebreaksbr }}{% endif %}</p></li>
+{% if profile_detail %}
+  <li class='list-group-item'>
+    <a href="{% url 'post:post_detail' post.id%}">подробная информация </a>
+  </li>
+{% endif %}
+{% if post.group and not without_group %}
+  <li class='list-group-item'>
+    Группа: <a href="{% url 'post:group_list' post.group.slug %}" > {{ post.group.title }}</a>
+  </li>
+{% endif %}
+{% if post_edit %}
+  <a class="btn btn-primary" href="{% url 'post:post_edit' post.id %}">Редактировать</span></a>
+{% endif %}
+'''  # noqa: E501
+LEGACY_PAGE = '''{% for post in posts %}
+  {% include card with profile_detail=True %}
+  {% if not forloop.last %}<hr>{% endif %}
+{% endfor %}'''
+CARDS_PAGE = '''{% load post_cards %}
+{% for post in posts %}
+  {% post_card post profile_detail=True %}
+  {% if not forloop.last %}<hr>{% endif %}
+{% endfor %}'''
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендеринга карточки поста через прежний '
+            '{% include %} и через {% post_card %} на 10, 100 и 1000 '
+            'постов на странице. '
+            'Посты создаются в памяти, база не нужна.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Сколько постов на странице.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз рендерить каждую страницу.')
+
+    def posts(self, count):
+        group = Group(pk=1, title='Тестовая группа', slug='test-group')
+        now = timezone.now()
+        return [
+            Post(
+                pk=number, text='Текст тестового поста. ' * 10,
+                author=User(pk=number % 50 + 1, username=f'author{number}'),
+                group=group, pub_date=now)
+            for number in range(1, count + 1)
+        ]
+
+    def measure(self, template, context, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            template.render(context)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        engine = engines['django']
+        legacy = engine.from_string(LEGACY_PAGE)
+        card = engine.from_string(LEGACY_CARD)
+        cards = engine.from_string(CARDS_PAGE)
+        self.stdout.write(
+            f'{"постов":>8}{"include, мкс/пост":>20}'
+            f'{"post_card, мкс/пост":>22}{"ускорение":>12}')
+        for size in options['sizes']:
+            posts = self.posts(size)
+            before = self.measure(
+                legacy, {'posts': posts, 'card': card}, options['repeat'])
+            after = self.measure(
+                cards, {'posts': posts}, options['repeat'])
+            self.stdout.write(
+                f'{size:>8}{before / size * 1e6:>20.1f}'
+                f'{after / size * 1e6:>22.1f}{before / after:>11.1f}x')
@@ -0,0 +1,39 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import search_posts
+from yatube.settings import PAGINATOR_COUNT
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время поиска по индексу FTS5 с прежним '
+            "LIKE '%...%' по таблице постов.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='+', help='Поисковые запросы для замера.')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз повторить каждый запрос.')
+
+    def measure(self, search, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            search()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f'Постов в базе: {Post.objects.count()}')
+        self.stdout.write(f'{"запрос":<24}{"LIKE, мс":>12}{"FTS5, мс":>12}')
+        for query in options['queries']:
+            like = self.measure(lambda: list(Post.objects.for_listing(
+            ).filter(text__icontains=query)[:PAGINATOR_COUNT + 1]), repeat)
+            fts = self.measure(
+                lambda: search_posts(query, PAGINATOR_COUNT), repeat)
+            self.stdout.write(f'{query:<24}{like:>12.2f}{fts:>12.2f}')
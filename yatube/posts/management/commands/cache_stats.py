@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import fragment_stats
+
+FRAGMENTS = ('index_page', 'follow_page', 'anonymous_page', 'shared_page')
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания и промахи кэша фрагментов страниц '
+            'и целых страниц.')
+
+    def handle(self, *args, **options):
+        for name, (hits, misses) in fragment_stats(*FRAGMENTS).items():
+            total = hits + misses
+            ratio = hits / total if total else 0
+            self.stdout.write(
+                f'{name}: попаданий {hits}, промахов {misses} ({ratio:.0%})')
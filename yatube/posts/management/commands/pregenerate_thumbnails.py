@@ -0,0 +1,58 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import (generate_thumbnails, pool, render_thumbnails,
+                              store_thumbnails)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт в пуле процессов миниатюры картинок всех постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Сколько процессов запустить (по умолчанию '
+                 'THUMBNAIL_WORKERS, 0 — в текущем процессе).')
+        parser.add_argument(
+            '--progress-every', type=int, default=100,
+            help='Через сколько картинок печатать прогресс.')
+
+    def outcomes(self, names, workers):
+        """Число созданных миниатюр или ошибка по каждой картинке.
+
+        Воркеры только создают файлы, а в базу их записывает эта команда.
+        """
+        if workers == 0:
+            for name in names:
+                try:
+                    yield generate_thumbnails(name)
+                except Exception as error:
+                    yield error
+            return
+        with pool(workers) as executor:
+            futures = {executor.submit(render_thumbnails, name): name
+                       for name in names}
+            for future in as_completed(futures):
+                try:
+                    yield store_thumbnails(futures[future], future.result())
+                except Exception as error:
+                    yield error
+
+    def handle(self, *args, **options):
+        names = list(Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct())
+        total, created, failed = len(names), 0, 0
+        every = max(1, options['progress_every'])
+        outcomes = self.outcomes(names, options['workers'])
+        for done, outcome in enumerate(outcomes, 1):
+            if isinstance(outcome, Exception):
+                failed += 1
+                self.stderr.write(f'Ошибка: {outcome}')
+            else:
+                created += outcome
+            if done % every == 0 or done == total:
+                self.stdout.write(f'Обработано картинок: {done}/{total}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано миниатюр: {created}, ошибок: {failed}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = ('Перестраивает полнотекстовый индекс постов, например после '
+            'правок posts_post в обход триггеров.')
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS('Индекс поиска перестроен'))
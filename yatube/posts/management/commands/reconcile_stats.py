@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import AuthorStats, Comment, Post, User
+from posts.stats import COUNTERS, count_stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает пачками счётчики постов и подписок авторов '
+            'и счётчики комментариев постов, исправляя расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько пользователей или постов пересчитывать за проход.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed = checked = 0
+        last_id = 0
+        while True:
+            user_ids = list(User.objects.filter(pk__gt=last_id).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            checked += len(user_ids)
+            fixed += self.reconcile(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено пользователей: {checked}, исправлено: {fixed}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено постов: {self.recount_comments(batch_size)}'))
+
+    def reconcile(self, user_ids):
+        actual = count_stats(user_ids)
+        with transaction.atomic():
+            stored = AuthorStats.objects.select_for_update().in_bulk(
+                user_ids)
+            changed, missing = [], []
+            for user_id, counters in actual.items():
+                stats = stored.get(user_id)
+                if stats is None:
+                    missing.append(AuthorStats(user_id=user_id, **counters))
+                    continue
+                if any(getattr(stats, field) != value
+                       for field, value in counters.items()):
+                    for field, value in counters.items():
+                        setattr(stats, field, value)
+                    changed.append(stats)
+            AuthorStats.objects.bulk_update(changed, list(COUNTERS))
+            AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+        return len(changed) + len(missing)
+
+    def recount_comments(self, batch_size):
+        total = Comment.objects.filter(post=OuterRef('pk')).order_by(
+        ).values('post').annotate(total=Count('pk')).values('total')
+        checked = last_id = 0
+        while True:
+            post_ids = list(Post.objects.filter(pk__gt=last_id).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+            if not post_ids:
+                return checked
+            last_id = post_ids[-1]
+            checked += len(post_ids)
+            Post.objects.filter(pk__in=post_ids).update(
+                comments_count=Coalesce(Subquery(total), 0))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.storage import sweep_images
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые больше не ссылается ни '
+            'один пост, и их миниатюры. Запускайте по расписанию: при '
+            'удалении поста недавно переиспользованная картинка остаётся.')
+
+    def handle(self, *args, **options):
+        removed = sweep_images()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок: {len(removed)}'))
@@ -0,0 +1,101 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .cache import get_versions, record_fragment
+
+# Заголовки, которые нельзя отдавать из кэша другому клиенту.
+SKIP_HEADERS = {'set-cookie'}
+# Параметры запроса, от которых зависит страница. Остальные (utm-метки,
+# случайные параметры против кэша) не плодят копии страницы в кэше.
+PAGE_PARAMS = ('page', 'cursor', 'q')
+
+
+def page_url(request):
+    """Хэш адреса страницы для ключа кэша: только параметры из PAGE_PARAMS
+    и всегда в одном порядке."""
+    params = urlencode([
+        (name, request.GET[name]) for name in PAGE_PARAMS
+        if name in request.GET
+    ])
+    url = request.build_absolute_uri(request.path) + '?' + params
+    return hashlib.md5(url.encode()).hexdigest()
+
+
+class PageCacheMiddleware:
+    """Кэш целых страниц для анонимов.
+
+    Стоит перед SessionMiddleware: запрос без cookie сессии при попадании
+    получает ответ без сессий, аутентификации, запросов к базе и
+    рендеринга. Кэшируются только ответы view с @surrogate_keys: вместе со
+    страницей хранятся версии её ключей, и запись, сбросившая любой из
+    них, делает страницу промахом. Версии снимаются до вызова view, так что
+    правка во время рендеринга не оставит в кэше устаревшую страницу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.cacheable_request(request):
+            return self.get_response(request)
+        key = self.cache_key(request)
+        entry = cache.get(key)
+        if entry is not None and get_versions(
+                *entry['versions']) == entry['versions']:
+            record_fragment('anonymous_page', True)
+            return self.cached_response(request, entry)
+        record_fragment('anonymous_page', False)
+        response = self.get_response(request)
+        if request.method == 'GET' and self.cacheable_response(response):
+            cache.set(key, self.entry(response), settings.PAGE_CACHE_TIMEOUT)
+        return response
+
+    def cacheable_request(self, request):
+        return (
+            settings.PAGE_CACHE_ENABLED
+            and request.method in ('GET', 'HEAD')
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    def cacheable_response(self, response):
+        return (
+            getattr(response, 'surrogate_versions', None) is not None
+            and response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+        )
+
+    def cache_key(self, request):
+        return f'page:{page_url(request)}'
+
+    def entry(self, response):
+        return {
+            'versions': response.surrogate_versions,
+            'content': response.content,
+            'headers': [
+                header for header in response.items()
+                if header[0].lower() not in SKIP_HEADERS
+            ],
+        }
+
+    def cached_response(self, request, entry):
+        headers = dict(entry['headers'])
+        response = get_conditional_response(
+            request, etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(
+                headers.get('Last-Modified', '')))
+        if response is None:
+            response = HttpResponse(entry['content'])
+            for header, value in entry['headers']:
+                response[header] = value
+        else:
+            for header in ('ETag', 'Last-Modified'):
+                if header in headers:
+                    response[header] = headers[header]
+        return response
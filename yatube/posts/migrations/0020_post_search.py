@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from posts.search_schema import create_search_index
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_indexes'),
+    ]
+
+    operations = [
+        create_search_index(),
+    ]
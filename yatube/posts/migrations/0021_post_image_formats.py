@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:33
+
+from django.db import migrations, models
+
+from posts.search_schema import with_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_search'),
+    ]
+
+    operations = with_search_triggers(
+        migrations.AddField(
+            model_name='post',
+            name='image_formats',
+            field=models.CharField(blank=True, editable=False, help_text='Готовые варианты миниатюр через запятую, например webp', max_length=50, verbose_name='Форматы миниатюр'),
+        ),
+    )
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:36
+
+from django.db import migrations, models
+
+from posts.search_schema import with_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_post_image_formats'),
+    ]
+
+    operations = with_search_triggers(
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.CharField(blank=True, editable=False, help_text='Средний цвет картинки, #rrggbb', max_length=7, verbose_name='Цвет заглушки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+    )
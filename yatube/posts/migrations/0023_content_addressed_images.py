@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:38
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_image_metadata'),
+    ]
+
+    operations = [
+        # Хранилище не меняет схему; SQLite же пересоздал бы всю таблицу
+        # постов (и удалил бы триггеры поиска) ради пустого AlterField.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, help_text='Загрузить картинку', storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['image'], name='post_image_idx'),
+        ),
+    ]
@@ -0,0 +1,234 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import bump_versions, get_version
+
+NEXT = 'n'
+PREVIOUS = 'p'
+LAST = 'l'
+# Версия закэшированных чисел записей: её сбрасывают сигналы записей,
+# которые меняют число постов в выборках.
+COUNTS = 'paginator:counts'
+
+
+def bump_counts():
+    bump_versions(COUNTS)
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, который не считает COUNT(*) на каждый запрос.
+
+    Общее число записей берётся из кэша: его сбрасывает bump_counts() при
+    появлении и удалении постов, а PAGINATOR_COUNT_TIMEOUT ограничивает
+    расхождение после записей в обход сигналов. Это оценка: по ней строятся
+    только номера страниц, а наличие следующей страницы определяется
+    выборкой на одну запись больше, чем помещается на страницу.
+    Если число записей уже известно (денормализованный счётчик), его
+    можно передать в count.
+    """
+
+    def __init__(self, object_list, per_page, *args, count=None, **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        if count is not None:
+            self.__dict__['count'] = count
+
+    @cached_property
+    def count(self):
+        query = str(getattr(self.object_list, 'query', ''))
+        if not query:
+            return super().count
+        key = 'paginator:count:{}:{}'.format(
+            get_version(COUNTS), hashlib.md5(query.encode()).hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def validate_number(self, number):
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы должен быть целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('На этой странице нет результатов')
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        if number == 1 and not page.has_more:
+            page.page_window = range(1, 2)
+        else:
+            page.page_window = self.page_window(number)
+        return page
+
+    def get_page(self, number):
+        """Как Paginator.get_page(): нечисловой номер ведёт на первую
+        страницу, номер за пределами — на последнюю непустую.
+
+        Число записей здесь оценка, поэтому для номера за пределами оно
+        пересчитывается точно; если и тогда последняя страница пуста,
+        отдаётся первая.
+        """
+        try:
+            return self.page(self.validate_number(number))
+        except PageNotAnInteger:
+            return self.page(1)
+        except EmptyPage:
+            pass
+        self.__dict__['count'] = Paginator.count.func(self)
+        self.__dict__.pop('num_pages', None)
+        try:
+            return self.page(self.num_pages)
+        except EmptyPage:
+            return self.page(1)
+
+    def page_window(self, number):
+        """Номера страниц вокруг текущей, не больше PAGINATOR_WINDOW с
+        каждой стороны."""
+        window = settings.PAGINATOR_WINDOW
+        last = max(number, min(self.num_pages, number + window))
+        return range(max(1, number - window), last + 1)
+
+
+def estimated_count(model):
+    """Число строк таблицы по статистике ANALYZE или None, если её нет."""
+    if connection.vendor != 'sqlite':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    return int(row[0].split()[0]) if row else None
+
+
+class EstimatedCountPaginator(CachedCountPaginator):
+    """Пагинатор для больших таблиц: число строк всей таблицы без
+    фильтров берётся из статистики SQLite (sqlite_stat1, её собирает
+    ANALYZE), а не из COUNT(*) по таблице.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(self.object_list.model)
+            if estimate is not None:
+                return estimate
+        return super().count
+
+
+class KeysetPaginator(CachedCountPaginator):
+    """Пагинатор с keyset-курсором по (дата, ключ), по умолчанию (дата, id).
+
+    Номерные страницы (?page=) работают по-прежнему, а ссылки вперёд/назад
+    ведут на непрозрачный курсор (?cursor=): страница по курсору читается
+    диапазоном по индексу без OFFSET и не «съезжает», когда появляются
+    новые записи. Последняя страница тоже открывается курсором: она
+    читается с конца выборки, а не через OFFSET на все страницы.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 key_field='id', **kwargs):
+        self.date_field = date_field
+        self.key_field = key_field
+        super().__init__(
+            object_list.order_by(f'-{date_field}', f'-{key_field}'),
+            per_page, **kwargs)
+
+    def encode_cursor(self, obj, direction):
+        position = '|'.join((
+            direction, getattr(obj, self.date_field).isoformat(),
+            str(getattr(obj, self.key_field))))
+        return base64.urlsafe_b64encode(
+            position.encode()).decode().rstrip('=')
+
+    @property
+    def last_cursor(self):
+        return base64.urlsafe_b64encode(LAST.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Возвращает (направление, дата, id) или None для битого курсора;
+        у курсора последней страницы нет позиции."""
+        try:
+            position = base64.urlsafe_b64decode(
+                cursor + '=' * (-len(cursor) % 4)).decode()
+            if position == LAST:
+                return LAST, None, None
+            direction, date, pk = position.split('|')
+            date, pk = parse_datetime(date), int(pk)
+        except (ValueError, binascii.Error, UnicodeDecodeError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or date is None:
+            return None
+        return direction, date, pk
+
+    def page(self, number):
+        page = super().page(number)
+        self._set_cursors(page, page.number > 1, page.has_more)
+        return page
+
+    def get_cursor_page(self, cursor):
+        """Страница до или после позиции курсора.
+
+        Битый курсор, как и неверный номер в get_page(), ведёт на первую
+        страницу; туда же ведёт шаг назад к самым новым записям и
+        последняя страница, если все записи помещаются на одну.
+        """
+        position = self.decode_cursor(cursor)
+        if position is None:
+            return self.get_page(1)
+        direction, date, pk = position
+        field, key = self.date_field, self.key_field
+        if direction == LAST:
+            rows = self.object_list.order_by(field, key)
+        elif direction == NEXT:
+            rows = self.object_list.filter(
+                Q(**{f'{field}__lt': date})
+                | Q(**{field: date, f'{key}__lt': pk}))
+        else:
+            rows = self.object_list.filter(
+                Q(**{f'{field}__gt': date})
+                | Q(**{field: date, f'{key}__gt': pk})).order_by(field, key)
+        rows = list(rows[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows or direction != NEXT and not more:
+            return self.get_page(1)
+        if direction != NEXT:
+            rows.reverse()
+        page = self._get_page(rows, None, self)
+        self._set_cursors(
+            page, direction == NEXT or more,
+            direction == PREVIOUS or direction == NEXT and more)
+        return page
+
+    def _set_cursors(self, page, has_previous, has_next):
+        page.previous_cursor = page.next_cursor = None
+        if not len(page):
+            return
+        if has_previous:
+            page.previous_cursor = self.encode_cursor(page[0], PREVIOUS)
+        if has_next:
+            page.next_cursor = self.encode_cursor(page[-1], NEXT)
@@ -0,0 +1,118 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Таблица posts_post_fts хранит только индекс (external content): текст
+берётся из posts_post, а синхронность поддерживают триггеры из
+search_schema, поэтому индекс не отстаёт и при bulk_create/update мимо
+сигналов.
+Результаты упорядочены по bm25, а страницы листаются курсором по паре
+(rank, id), как ленты постов — по (дата, id).
+"""
+import base64
+import binascii
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .search_schema import TABLE
+
+# Границы совпадения в сниппете: управляющие символы не встречаются
+# в тексте постов и переживают экранирование HTML.
+MATCH_START, MATCH_END = '\x02', '\x03'
+SNIPPET_TOKENS = 16
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасное выражение MATCH.
+
+    Слова ищутся все сразу, последнее — как префикс, чтобы поиск
+    находил посты по недописанному слову. Операторы FTS5 из ввода
+    не доходят до SQLite.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def rebuild():
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+
+
+def matching_ids_sql(query):
+    """SQL и параметры подзапроса id постов, подходящих под query."""
+    return (f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+            [match_expression(query)])
+
+
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(
+        f'{rank!r}|{pk}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (rank, id) или None для битого курсора."""
+    try:
+        rank, pk = base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)).decode().split('|')
+        return float(rank), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(
+        MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+class SearchPage(list):
+    """Страница результатов: посты с search_rank и snippet и курсор
+    следующей страницы."""
+
+    def __init__(self, posts, next_cursor=None):
+        super().__init__(posts)
+        self.next_cursor = next_cursor
+
+
+def search_posts(query, per_page, cursor=None):
+    """Страница постов по запросу, лучшие совпадения по bm25 первыми.
+
+    Битый курсор, как и в лентах, ведёт на первую страницу.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return SearchPage([])
+    sql = (
+        f'SELECT rowid, rank, snippet({TABLE}, 0, %s, %s, %s, %s) '
+        f'FROM {TABLE} WHERE {TABLE} MATCH %s')
+    params = [MATCH_START, MATCH_END, '…', SNIPPET_TOKENS, expression]
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [position[0], position[0], position[1]]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(per_page + 1)
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    posts = Post.objects.for_listing().in_bulk([pk for pk, _, _ in rows])
+    page = []
+    for pk, rank, snippet in rows:
+        post = posts.get(pk)
+        if post is None:
+            continue
+        post.search_rank = rank
+        post.snippet = highlight(snippet)
+        page.append(post)
+    next_cursor = None
+    if more:
+        pk, rank, _ = rows[-1]
+        next_cursor = encode_cursor(rank, pk)
+    return SearchPage(page, next_cursor)
@@ -0,0 +1,62 @@
+"""Схема полнотекстового индекса постов для миграций.
+
+Индекс FTS5 с внешним содержимым: текст хранится только в posts_post,
+а триггеры повторяют в индексе каждую вставку, правку и удаление.
+SQLite меняет столбцы posts_post пересозданием таблицы и удаляет вместе
+со старой таблицей её триггеры, поэтому каждая миграция, которая меняет
+схему Post, оборачивает свои операции в with_search_triggers().
+Модуль не импортирует модели: его вызывают миграции.
+"""
+from django.db import migrations
+
+TABLE = 'posts_post_fts'
+CREATE_TABLE = [
+    f"CREATE VIRTUAL TABLE {TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+]
+CREATE_TRIGGERS = [
+    f"CREATE TRIGGER {TABLE}_insert AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER {TABLE}_delete AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER {TABLE}_update AFTER UPDATE OF text ON posts_post "
+    f"BEGIN INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END",
+]
+REBUILD = [f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')"]
+DROP_TRIGGERS = [
+    f'DROP TRIGGER IF EXISTS {TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {TABLE}_update',
+]
+DROP_TABLE = [f'DROP TABLE IF EXISTS {TABLE}']
+
+
+def run(statements):
+    """Операция RunPython, выполняющая statements только на SQLite."""
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return operation
+
+
+def create_search_index():
+    """Операция миграции, создающая индекс с триггерами."""
+    return migrations.RunPython(
+        run(CREATE_TABLE + CREATE_TRIGGERS + REBUILD),
+        run(DROP_TRIGGERS + DROP_TABLE))
+
+
+def with_search_triggers(*operations):
+    """Операции миграции, пересоздающие posts_post, между удалением
+    триггеров поиска и их созданием заново."""
+    return [
+        migrations.RunPython(run(DROP_TRIGGERS), run(CREATE_TRIGGERS)),
+        *operations,
+        migrations.RunPython(run(CREATE_TRIGGERS), run(DROP_TRIGGERS)),
+    ]
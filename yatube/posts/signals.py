@@ -0,0 +1,269 @@
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cache import bump_content_generation
+from .feed import (backfill_follow, fan_out_post, followers, group_readers,
+                   invalidate_feeds, remove_follow)
+from .models import Comment, Follow, Group, Post, User
+from .paginators import bump_counts
+from .stats import change_stats
+from .storage import release_image
+from .surrogate import (GROUPS, INDEX, author_key, group_key, post_key,
+                        purge)
+from .thumbnails import schedule_thumbnails
+
+# Посты и авторы, которые сейчас удаляются. Комментарии и посты уходят
+# вместе с ними, и то, что receivers делают для каждого из них, делается
+# один раз для родителя. Collector рассылает pre_delete всем объектам
+# раньше первого удаления, а post_delete — в порядке удаления моделей,
+# и родитель снимает метку в post_delete как раньше детей, так и позже:
+# поэтому дети проверяют и метку родителя, и свою из pre_delete.
+_deleting_posts = set()
+_deleting_authors = set()
+
+
+def _post_deleting(comment):
+    return comment.post_id in _deleting_posts or getattr(
+        comment, '_post_deleting', False)
+
+
+def _author_deleting(post):
+    return post.author_id in _deleting_authors or getattr(
+        post, '_author_deleting', False)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def content_changed(sender, instance, **kwargs):
+    if sender is Comment and _post_deleting(instance) or (
+            sender is Post and _author_deleting(instance)):
+        return
+    bump_content_generation()
+
+
+@receiver(post_save, sender=Post)
+def post_counts_changed(sender, instance, created, **kwargs):
+    previous_group_id = getattr(
+        instance, '_previous_group_id', instance.group_id)
+    if created or previous_group_id != instance.group_id:
+        bump_counts()
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def counts_changed(sender, instance, **kwargs):
+    """Число записей в выборках меняют посты и подписки: лента подписок
+    тоже листается пагинатором."""
+    if not (sender is Post and _author_deleting(instance)):
+        bump_counts()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_pages_changed(sender, instance, **kwargs):
+    if _author_deleting(instance):
+        return
+    group_ids = {
+        instance.group_id, getattr(instance, '_previous_group_id', None),
+    } - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True) if group_ids else []
+    purge(INDEX, author_key(instance.author_id), post_key(instance.pk),
+          *map(group_key, slugs))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_pages_changed(sender, instance, **kwargs):
+    if not _post_deleting(instance):
+        purge(post_key(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_pages_changed(sender, instance, **kwargs):
+    purge(INDEX, GROUPS, group_key(instance.slug))
+
+
+@receiver(pre_save, sender=Group)
+def group_renaming(sender, instance, **kwargs):
+    """Запоминает прежние название и slug группы."""
+    if instance.pk:
+        instance._previous_names = Group.objects.filter(
+            pk=instance.pk).values_list('title', 'slug').first()
+
+
+@receiver(post_save, sender=Group)
+def group_renamed(sender, instance, **kwargs):
+    """Карточки в лентах выводят название и адрес группы, а кэш ленты
+    зависит только от её версии."""
+    previous = getattr(instance, '_previous_names', None)
+    if previous is None or previous == (instance.title, instance.slug):
+        return
+    purge(group_key(previous[1]))
+    invalidate_feeds(group_readers(instance.pk))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleting(sender, instance, **kwargs):
+    # После удаления у постов уже не будет группы, по которой их искать.
+    instance._readers = group_readers(instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    invalidate_feeds(getattr(instance, '_readers', []))
+
+
+@receiver(pre_save, sender=User)
+def user_renaming(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежнее имя пользователя; вход в систему сохраняет
+    только last_login и сюда не доходит."""
+    if not instance.pk or update_fields is not None and (
+            'username' not in update_fields):
+        return
+    instance._previous_username = User.objects.filter(
+        pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, **kwargs):
+    """Имя автора есть на карточках всех его постов, под его
+    комментариями и в ссылках на профиль: сбрасываются страницы с ними
+    и ленты подписчиков."""
+    previous = getattr(instance, '_previous_username', None)
+    if previous is None or previous == instance.username:
+        return
+    slugs = Group.objects.filter(posts__author=instance).values_list(
+        'slug', flat=True).distinct()
+    commented = Comment.objects.filter(author=instance).order_by(
+    ).values_list('post_id', flat=True).distinct()
+    purge(INDEX, author_key(instance.pk), *map(group_key, slugs),
+          *map(post_key, commented))
+    bump_content_generation()
+    invalidate_feeds(followers(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    """Запоминает всё, что нужно сбросить после удаления постов автора."""
+    _deleting_authors.add(instance.pk)
+    posts = list(Post.objects.filter(author=instance).values_list(
+        'pk', 'image'))
+    instance._post_ids = [pk for pk, _ in posts]
+    instance._images = {image for _, image in posts if image}
+    instance._group_slugs = list(Group.objects.filter(
+        posts__author=instance).values_list('slug', flat=True).distinct())
+    instance._followers = followers(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    _deleting_authors.discard(instance.pk)
+    purge(INDEX, author_key(instance.pk),
+          *map(post_key, instance._post_ids),
+          *map(group_key, instance._group_slugs))
+    bump_content_generation()
+    bump_counts()
+    for name in instance._images:
+        release_image(name)
+    invalidate_feeds(instance._followers)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_pages_changed(sender, instance, **kwargs):
+    purge(author_key(instance.author_id), author_key(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, 'posts_count', 1)
+        invalidate_feeds(fan_out_post(instance))
+    else:
+        invalidate_feeds(followers(instance.author_id))
+
+
+@receiver(pre_save, sender=Post)
+def post_replacing(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежние картинку и группу поста, которые меняет save()."""
+    if not instance.pk or update_fields is not None and not (
+            {'image', 'group'} & set(update_fields)):
+        return
+    previous = Post.objects.filter(pk=instance.pk).values_list(
+        'image', 'group_id').first()
+    if previous is not None:
+        instance._previous_image, instance._previous_group_id = previous
+
+
+@receiver(post_save, sender=Post)
+def post_image_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image:
+        schedule_thumbnails(instance.image.name)
+    previous = getattr(instance, '_previous_image', None)
+    if previous and previous != instance.image.name:
+        release_image(previous)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    _deleting_posts.add(instance.pk)
+    instance._author_deleting = _author_deleting(instance)
+
+
+@receiver(pre_delete, sender=Comment)
+def comment_deleting(sender, instance, **kwargs):
+    instance._post_deleting = _post_deleting(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts.discard(instance.pk)
+    if _author_deleting(instance):
+        return
+    change_stats(instance.author_id, 'posts_count', -1)
+    release_image(instance.image.name)
+    invalidate_feeds(followers(instance.author_id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created and instance.post_id:
+        Post.objects.filter(pk=instance.post_id).update(
+            comments_count=F('comments_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if _post_deleting(instance):
+        return
+    Post.objects.filter(
+        pk=instance.post_id, comments_count__gt=0).update(
+            comments_count=F('comments_count') - 1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        change_stats(instance.author_id, 'followers_count', 1)
+        change_stats(instance.user_id, 'following_count', 1)
+        backfill_follow(instance)
+        invalidate_feeds([instance.user_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_stats(instance.author_id, 'followers_count', -1)
+    change_stats(instance.user_id, 'following_count', -1)
+    remove_follow(instance)
+    invalidate_feeds([instance.user_id])
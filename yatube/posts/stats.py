@@ -0,0 +1,50 @@
+"""Денормализованные счётчики автора: постов, подписчиков и подписок.
+
+Строка AuthorStats появляется при первом увеличении счётчика или первом
+показе статистики и сразу заполняется честным пересчётом, поэтому
+уменьшение счётчика без строки можно просто пропустить. Расхождения
+чинит команда reconcile_stats.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import AuthorStats, Follow, Post
+
+COUNTERS = {
+    'posts_count': (Post, 'author_id'),
+    'followers_count': (Follow, 'author_id'),
+    'following_count': (Follow, 'user_id'),
+}
+
+
+def count_stats(user_ids):
+    """Считает счётчики по исходным таблицам: {user_id: {поле: число}}."""
+    stats = {user_id: dict.fromkeys(COUNTERS, 0) for user_id in user_ids}
+    for field, (model, column) in COUNTERS.items():
+        rows = model.objects.filter(**{f'{column}__in': user_ids}).order_by(
+        ).values(column).annotate(total=Count('pk')).values_list(
+            column, 'total')
+        for user_id, total in rows:
+            stats[user_id][field] = total
+    return stats
+
+
+def stats_for(user):
+    """Статистика пользователя; без строки в базе считается и
+    сохраняется, чтобы следующие показы обошлись без пересчёта."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        stats = AuthorStats(user=user, **count_stats([user.pk])[user.pk])
+        AuthorStats.objects.bulk_create([stats], ignore_conflicts=True)
+        return stats
+
+
+def change_stats(user_id, field, delta):
+    with transaction.atomic():
+        updated = AuthorStats.objects.filter(
+            user_id=user_id, **{f'{field}__gte': -delta}).update(
+                **{field: F(field) + delta})
+        if not updated and delta > 0:
+            AuthorStats.objects.update_or_create(
+                user_id=user_id, defaults=count_stats([user_id])[user_id])
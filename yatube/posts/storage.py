@@ -0,0 +1,128 @@
+"""Хранилище картинок постов, адресуемое содержимым.
+
+Файл называется по SHA-256 своего содержимого и раскладывается по
+подкаталогам из первых символов хэша: posts/ab/cd/abcd….jpg. Одинаковые
+загрузки получают одно имя, поэтому делят один файл и — раз имя
+миниатюры sorl зависит от имени картинки — один набор миниатюр.
+
+Ссылки на файл считаются по постам с этим image: файл, миниатюры и их
+варианты удаляются, только когда на картинку не ссылается ни один пост.
+Файл, который release_image() оставил как недавно переиспользованный,
+позже удаляет команда sweep_images.
+"""
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    # Сколько уровней подкаталогов и по сколько символов хэша в каждом.
+    shard_levels = 2
+    shard_width = 2
+
+    def content_name(self, name, content):
+        """Имя файла по хэшу содержимого в каталоге исходного имени."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        shards = [
+            digest[level * self.shard_width:(level + 1) * self.shard_width]
+            for level in range(self.shard_levels)
+        ]
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        return '/'.join(
+            part for part in (directory, *shards, digest + extension)
+            if part)
+
+    def save(self, name, content, max_length=None):
+        """Сохраняет файл или возвращает имя уже сохранённой копии.
+
+        Время изменения существующей копии обновляется: по нему
+        release_image() не удаляет файл, который только что переиспользовали
+        в ещё не закоммиченной транзакции.
+        """
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def recently_used(self, name):
+        age = time.time() - os.path.getmtime(self.path(name))
+        return age < settings.MEDIA_RELEASE_GRACE
+
+
+def image_storage():
+    from .models import Post
+
+    return Post._meta.get_field('image').storage
+
+
+def release_image(name):
+    """После коммита удаляет картинку, если на неё больше не ссылаются."""
+    if name:
+        transaction.on_commit(lambda: _release(name))
+
+
+def _release(name):
+    """Удаляет картинку без ссылок; True, если удалила."""
+    from .models import Post
+    from .thumbnails import delete_thumbnails
+
+    storage = image_storage()
+    try:
+        if not storage.exists(name) or storage.recently_used(name):
+            # Недавно переиспользованный файл подберёт sweep_images().
+            return False
+    except SuspiciousFileOperation:
+        return False
+    if Post.objects.filter(image=name).exists():
+        return False
+    delete_thumbnails(name)
+    storage.delete(name)
+    return True
+
+
+def stored_names(storage, directory):
+    """Имена всех файлов каталога хранилища вместе с подкаталогами."""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for subdirectory in directories:
+        yield from stored_names(storage, f'{directory}/{subdirectory}')
+
+
+def sweep_images():
+    """Удаляет картинки, на которые не ссылается ни один пост, вместе с
+    миниатюрами; возвращает их имена.
+
+    Подбирает файлы, которые release_image() не удалил, потому что их
+    переиспользовали меньше MEDIA_RELEASE_GRACE секунд назад.
+    """
+    from .models import Post
+
+    storage = image_storage()
+    directory = Post._meta.get_field('image').upload_to.rstrip('/')
+    if not storage.exists(directory):
+        return []
+    referenced = set(Post.objects.exclude(image='').values_list(
+        'image', flat=True))
+    return [
+        name for name in stored_names(storage, directory)
+        if name not in referenced and _release(name)
+    ]
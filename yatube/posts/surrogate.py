@@ -0,0 +1,115 @@
+"""Суррогатные ключи страниц постов.
+
+Ключ называет часть данных, из которой собрана страница: index — лента
+всех постов, group:<slug> — посты группы, author:<id> — посты и счётчики
+автора, post:<id> — пост с комментариями, groups — названия групп на
+карточках, feed:<id> — лента подписок пользователя. У каждого ключа есть
+версия в posts.cache; сигналы записи постов, комментариев, групп и
+подписок сбрасывают ровно те ключи, которые затронула запись.
+
+ETag страницы складывается из версий её ключей, поэтому повторный
+запрос получает 304 без обращения к постам и без рендеринга шаблона.
+Клиентам без ETag страница отдаёт Last-Modified — дату самого нового
+поста или комментария на ней — и отвечает 304 на If-Modified-Since.
+По тем же версиям PageCacheMiddleware проверяет закэшированные для
+анонимов страницы, а заголовок Surrogate-Key позволяет так же точно
+сбрасывать страницы во фронтовом кэше.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+from .cache import bump_versions, get_versions
+from .holes import shared_applies, shared_page
+
+INDEX = 'index'
+GROUPS = 'groups'
+
+
+def group_key(slug):
+    return f'group:{slug}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def feed_key(user_id):
+    # Совпадает с версией ленты из posts.feed.
+    return f'feed:{user_id}'
+
+
+def purge(*keys):
+    """Сбрасывает ключи: страницы с ними получат новый ETag."""
+    bump_versions(*keys)
+
+
+def page_etag(request, versions):
+    """ETag страницы по версиям её ключей.
+
+    В него входят пользователь и CSRF-cookie: шаблоны выводят имя
+    пользователя и токен формы, которые не должны достаться другому.
+    """
+    parts = [
+        str(request.user.pk or 0),
+        request.META.get('CSRF_COOKIE', ''),
+        *(f'{key}={versions[key]}' for key in sorted(versions)),
+    ]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def page_last_modified(versions, func, request, *args, **kwargs):
+    """Дата для Last-Modified, запомненная до смены версий ключей: при тех
+    же версиях на странице те же посты и комментарии."""
+    parts = (f'{key}={versions[key]}' for key in sorted(versions))
+    key = 'modified:' + hashlib.md5('|'.join(parts).encode()).hexdigest()
+    entry = cache.get(key)
+    if entry is None:
+        entry = {'date': func(request, *args, **kwargs)}
+        cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT)
+    return entry['date']
+
+
+def surrogate_keys(keys_func, shared=True, last_modified_func=None):
+    """Декоратор view: @surrogate_keys(post_detail_keys).
+
+    keys_func(request, *args, **kwargs) возвращает ключи страницы или
+    None, если их нет (страница всё равно ответит 404). Версии ключей
+    читаются до вызова view и дают ETag для условного GET; ключи уходят
+    в заголовок Surrogate-Key, а ключи и версии — в атрибуты ответа, по
+    которым его кэширует PageCacheMiddleware. Вошедшим пользователям
+    страница собирается из общей части в кэше и их личных дыр, если
+    shared не выключен: страница целиком своя у каждого, как лента.
+    last_modified_func с теми же аргументами возвращает дату для
+    Last-Modified.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            keys = keys_func(request, *args, **kwargs)
+            if not keys:
+                return view(request, *args, **kwargs)
+            versions = get_versions(*keys)
+            page = view
+            if shared and shared_applies(request):
+                page = shared_page(view, versions)
+            response = condition(
+                etag_func=lambda *args, **kwargs: page_etag(
+                    request, versions),
+                last_modified_func=last_modified_func and (
+                    lambda *args, **kwargs: page_last_modified(
+                        versions, last_modified_func, *args, **kwargs)),
+            )(page)(request, *args, **kwargs)
+            response['Surrogate-Key'] = ' '.join(keys)
+            response.surrogate_versions = versions
+            return response
+        return wrapper
+    return decorator
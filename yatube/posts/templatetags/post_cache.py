@@ -0,0 +1,55 @@
+from django import template
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.cache import record_fragment
+from posts.holes import punch_hole
+
+register = template.Library()
+
+
+class CountedCacheNode(template.Node):
+    def __init__(self, nodelist, expire_time, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time = expire_time
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        expire_time = self.expire_time.resolve(context)
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on])
+        value = cache.get(key)
+        record_fragment(self.fragment_name, value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, expire_time)
+        return value
+
+
+@register.tag
+def counted_cache(parser, token):
+    """Как {% cache %}, но ведёт счётчики попаданий и промахов.
+
+    {% counted_cache <timeout|None> <fragment_name> [vary_on ...] %}
+    """
+    nodelist = parser.parse(('endcounted_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'{tokens[0]} требует таймаут и имя фрагмента')
+    return CountedCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]])
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **args):
+    """Часть страницы, своя у каждого пользователя: на общей странице
+    остаётся меткой и заполняется при ответе.
+
+    {% hole 'follow_button' author_id=author.pk username=author.username %}
+    """
+    return punch_hole(context['request'], name, args)
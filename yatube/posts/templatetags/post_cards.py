@@ -0,0 +1,15 @@
+from django import template
+
+from posts.cards import page_renderer
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, **flags):
+    """Карточка поста. Шаблон карточки и адреса готовятся один раз на
+    страницу для каждого набора флагов.
+
+    {% post_card post profile_detail=True %}
+    """
+    return page_renderer(context, **flags).render(context, post)
@@ -0,0 +1,69 @@
+from django import template
+
+from posts.images import VARIANT_TYPES, variant_name
+from posts.thumbnails import cached_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, size):
+    """Готовая миниатюра картинки поста или None, пока её не создал воркер.
+
+    Миниатюры, которые view разом нашёл через attach_thumbnails(),
+    берутся из post.thumbnails без обращения к KV-хранилищу.
+
+    {% post_thumbnail post 'card' as im %}
+    """
+    if not post.image:
+        return None
+    thumbnails = getattr(post, 'thumbnails', None)
+    if thumbnails is not None and size in thumbnails:
+        return thumbnails[size]
+    return cached_thumbnail(post.image, size)
+
+
+def placeholder(post):
+    """Цвет и пропорции заглушки из полей поста; пока размеры картинки
+    не записаны, заглушка вдвое шире высоты."""
+    if post.image_width and post.image_height:
+        ratio = f'{post.image_width} / {post.image_height}'
+    else:
+        ratio = '2 / 1'
+    return {'color': post.image_placeholder, 'ratio': ratio}
+
+
+@register.inclusion_tag('posts/includes/post_picture.html')
+def post_picture(post):
+    """Картинка карточки поста: <picture> с вариантами в современных
+    форматах и srcset из двух размеров, пока миниатюры нет — заглушка
+    цвета и пропорций картинки. Размеры и цвет берутся из полей поста
+    и сериализованной миниатюры, файлы картинок при выводе не открываются.
+
+    {% post_picture post %}
+    """
+    card = post_thumbnail(post, 'card')
+    if card is None:
+        return {'picture': None, 'placeholder': placeholder(post)}
+    thumbnails = [
+        thumbnail for thumbnail in (post_thumbnail(post, 'card_small'), card)
+        if thumbnail is not None
+    ]
+
+    def srcset(image_format=None):
+        return ', '.join(
+            '{} {}w'.format(
+                variant_name(thumbnail.url, image_format)
+                if image_format else thumbnail.url,
+                thumbnail.width)
+            for thumbnail in thumbnails)
+
+    formats = [image_format for image_format in
+               post.image_formats.split(',') if image_format in VARIANT_TYPES]
+    return {
+        'picture': card,
+        'placeholder': placeholder(post),
+        'srcset': srcset(),
+        'sources': [(VARIANT_TYPES[image_format], srcset(image_format))
+                    for image_format in formats],
+    }
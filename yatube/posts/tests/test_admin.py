@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+POSTS_URL = reverse('admin:posts_post_changelist')
+COMMENTS_URL = reverse('admin:posts_comment_changelist')
+FOLLOWS_URL = reverse('admin:posts_follow_changelist')
+PER_PAGE = 100
+
+
+class ScalableAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_rows(self, count):
+        start = User.objects.count()
+        authors = [User.objects.create(username=f'author-{number}')
+                   for number in range(start, start + count)]
+        Post.objects.bulk_create(
+            Post(text='Пост', author=author, group=self.group)
+            for author in authors)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.author, text='Комментарий')
+            for post in Post.objects.filter(author__in=authors))
+        Follow.objects.bulk_create(
+            Follow(user=self.author, author=author) for author in authors)
+
+    def queries(self, url, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_changelist_queries_do_not_grow(self):
+        """Число запросов списка не зависит от числа строк"""
+        for url in (POSTS_URL, COMMENTS_URL, FOLLOWS_URL):
+            self.create_rows(2)
+            few, _ = self.queries(url)
+            self.create_rows(20)
+            with self.subTest(url=url):
+                self.assertEqual(self.queries(url)[0], few)
+
+    def test_relations_use_autocomplete(self):
+        """Связи редактируются автодополнением, а не списком всех строк"""
+        self.create_rows(2)
+        for url in (POSTS_URL, FOLLOWS_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'admin-autocomplete')
+                self.assertNotContains(response, '>admin</option>')
+
+    def test_estimated_count_skips_count(self):
+        """После ANALYZE список без фильтров не считает COUNT(*)"""
+        self.create_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(POSTS_URL)
+        self.assertFalse(
+            [query for query in queries.captured_queries
+             if 'COUNT(' in query['sql']])
+
+    def test_changelist_pages_by_cursor(self):
+        """Список листается курсором и не повторяет строки"""
+        self.create_rows(PER_PAGE + 5)
+        first = self.client.get(POSTS_URL).context['cl']
+        self.assertIsNotNone(first.next_cursor_url)
+        second = self.client.get(
+            POSTS_URL + first.next_cursor_url).context['cl']
+        self.assertEqual(len(second.result_list), 5)
+        self.assertFalse(
+            set(first.result_list) & set(second.result_list))
+        self.assertIsNone(second.next_cursor_url)
+        self.assertIsNotNone(second.previous_cursor_url)
+
+    def test_sorted_changelist_ignores_cursor(self):
+        """Сортировка по колонке работает без курсора"""
+        self.create_rows(3)
+        _, response = self.queries(POSTS_URL, o='1')
+        self.assertIsNone(response.context['cl'].next_cursor_url)
@@ -0,0 +1,50 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from ..cards import UrlPattern
+from ..models import Group, Post, User
+
+
+class PostCardsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор.Тест')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='Тестовое описание')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+
+    def test_url_pattern_matches_reverse(self):
+        """Адрес по готовому шаблону совпадает с reverse()"""
+        cases = (
+            ('posts:profile', self.author.username),
+            ('posts:group_list', self.group.slug),
+            ('posts:post_detail', self.post.pk),
+            ('posts:post_edit', 1234567),
+        )
+        for name, value in cases:
+            with self.subTest(name=name, value=value):
+                self.assertEqual(
+                    UrlPattern(name)(value), reverse(name, args=[value]))
+
+    def test_cards_links(self):
+        """Карточки ссылаются на автора, пост и группу по флагам страницы"""
+        profile = reverse('posts:profile', args=[self.author.username])
+        detail = reverse('posts:post_detail', args=[self.post.pk])
+        group = reverse('posts:group_list', args=[self.group.slug])
+        edit = reverse('posts:post_edit', args=[self.post.pk])
+        cases = (
+            (reverse('posts:index'), (profile, group), (detail, edit)),
+            (profile, (profile, detail, group), (edit,)),
+            (group, (profile,), (f'href="{group}"', detail, edit)),
+            (detail, (profile, group, edit), ()),
+        )
+        for url, present, absent in cases:
+            with self.subTest(url=url):
+                content = self.client.get(url).content.decode()
+                for link in present:
+                    self.assertIn(link, content)
+                for link in absent:
+                    self.assertNotIn(link, content)
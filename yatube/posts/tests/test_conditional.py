@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..models import Comment, Follow, Group, Post, User
+
+INDEX_URL = reverse('posts:index')
+FOLLOW_INDEX = reverse('posts:follow_index')
+SLUG = 'test-slug'
+GROUP_URL = reverse('posts:group_list', kwargs={'slug': SLUG})
+AUTHOR = 'TestAuthor'
+PROFILE_URL = reverse('posts:profile', kwargs={'username': AUTHOR})
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug=SLUG,
+            description='Тестовое описание')
+        cls.other_group = Group.objects.create(
+            title='Другая группа', slug='other-slug',
+            description='Тестовое описание')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+        cls.POST_DETAIL_URL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        # Версии ключей и запомненные по ним даты переживают откат базы
+        # после теста: у поста другого теста был бы чужой комментарий.
+        cache.clear()
+        self.client.force_login(self.reader)
+        # Первая форма на странице выставляет CSRF-cookie, а она входит
+        # в ETag.
+        self.client.get(self.POST_DETAIL_URL)
+
+    def etag(self, url):
+        return self.client.get(url)['ETag']
+
+    def is_fresh(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response.status_code == 304
+
+    def test_repeat_visit_not_rendered(self):
+        """Повторный запрос с ETag получает 304 без рендеринга"""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL,
+                    self.POST_DETAIL_URL, FOLLOW_INDEX):
+            etag = self.etag(url)
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def test_writes_change_only_affected_pages(self):
+        """Запись меняет ETag только тех страниц, которые она затронула"""
+        writes = (
+            (lambda: Post.objects.create(
+                text='Пост в другой группе', author=self.reader,
+                group=self.other_group),
+             [INDEX_URL], [GROUP_URL, PROFILE_URL, self.POST_DETAIL_URL]),
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+             [self.POST_DETAIL_URL], [INDEX_URL, GROUP_URL, PROFILE_URL]),
+            (lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+             [PROFILE_URL, self.POST_DETAIL_URL, FOLLOW_INDEX],
+             [INDEX_URL, GROUP_URL]),
+            (lambda: Post.objects.filter(pk=self.post.pk).first().save(),
+             [INDEX_URL, GROUP_URL, PROFILE_URL, self.POST_DETAIL_URL],
+             []),
+        )
+        for write, changed, unchanged in writes:
+            etags = {url: self.etag(url)
+                     for url in (*changed, *unchanged)}
+            write()
+            for url in changed:
+                with self.subTest(url=url):
+                    self.assertFalse(self.is_fresh(url, etags[url]))
+            for url in unchanged:
+                with self.subTest(url=url):
+                    self.assertTrue(self.is_fresh(url, etags[url]))
+
+    def test_commenter_rename_changes_post_pages(self):
+        """Переименование комментатора меняет страницы постов с его
+        комментариями"""
+        commenter = User.objects.create_user(username='Commenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text='Комментарий')
+        etag = self.etag(self.POST_DETAIL_URL)
+        commenter.username = 'RenamedCommenter'
+        commenter.save()
+        self.assertFalse(self.is_fresh(self.POST_DETAIL_URL, etag))
+
+    def test_if_modified_since(self):
+        """Страница отвечает 304 на If-Modified-Since, пока на ней нет
+        поста или комментария новее"""
+        urls = (INDEX_URL, GROUP_URL, PROFILE_URL, self.POST_DETAIL_URL)
+        modified = {url: self.client.get(url)['Last-Modified'] for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    modified[url], http_date(self.post.pub_date.timestamp()))
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=modified[url])
+                self.assertEqual(response.status_code, 304)
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Comment.objects.filter(pk=comment.pk).update(
+            created=self.post.pub_date + timedelta(hours=1))
+        response = self.client.get(
+            self.POST_DETAIL_URL,
+            HTTP_IF_MODIFIED_SINCE=modified[self.POST_DETAIL_URL])
+        self.assertEqual(response.status_code, 200)
+
+    def test_moved_post_changes_both_groups(self):
+        """Перенос поста в другую группу меняет страницы обеих групп"""
+        other_url = reverse(
+            'posts:group_list', kwargs={'slug': self.other_group.slug})
+        etags = {url: self.etag(url) for url in (GROUP_URL, other_url)}
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                self.assertFalse(self.is_fresh(url, etag))
+
+    def test_etag_depends_on_user(self):
+        """ETag одного пользователя не подходит другому"""
+        etag = self.etag(INDEX_URL)
+        self.client.force_login(self.author)
+        self.assertFalse(self.is_fresh(INDEX_URL, etag))
@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..feed import fan_out_post
+from ..models import FeedItem, Follow, Group, Post, User
+
+FOLLOW_INDEX = reverse('posts:follow_index')
+READER = 'Reader'
+AUTHOR = 'TestAuthor'
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username=READER)
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        item = FeedItem.objects.get(user=self.reader, post=post)
+        self.assertEqual(item.pub_date, post.pub_date)
+        page = self.client.get(FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(list(page), [post, self.old_post])
+
+    def test_feed_cache_follows_feed_version(self):
+        """Кэш ленты сбрасывается только изменениями этой ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        other = User.objects.create_user(username='Other')
+        before = self.client.get(FOLLOW_INDEX).content
+        Post.objects.create(text='Чужой пост', author=other)
+        Post.objects.filter(pk=self.old_post.pk).update(text='Тихая правка')
+        self.assertEqual(self.client.get(FOLLOW_INDEX).content, before)
+        Post.objects.create(text='Пост автора', author=self.author)
+        self.assertContains(self.client.get(FOLLOW_INDEX), 'Пост автора')
+
+    def test_feed_cache_follows_renames(self):
+        """Переименование группы и автора сбрасывает кэш ленты"""
+        group = Group.objects.create(
+            title='Старое название', slug='old-slug', description='')
+        Post.objects.create(text='Пост в группе', author=self.author,
+                            group=group)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.client.get(FOLLOW_INDEX), 'old-slug')
+        group.title, group.slug = 'Новое название', 'new-slug'
+        group.save()
+        response = self.client.get(FOLLOW_INDEX)
+        self.assertContains(response, 'Новое название')
+        self.assertContains(response, 'new-slug')
+        self.author.username = 'RenamedAuthor'
+        self.author.save()
+        self.assertContains(self.client.get(FOLLOW_INDEX), 'RenamedAuthor')
+
+    def test_author_is_deleted_with_posts_at_once(self):
+        """Удаление автора сбрасывает ленты и страницы один раз, а не
+        для каждого его поста"""
+        author = User.objects.create_user(username='Leaving')
+        Follow.objects.create(user=self.reader, author=author)
+        Post.objects.bulk_create(
+            Post(text=f'Пост {number}', author=author)
+            for number in range(20))
+        self.client.get(FOLLOW_INDEX)
+        with self.assertNumQueries(24):
+            author.delete()
+        self.assertFalse(Post.objects.filter(author_id=author.id).exists())
+        self.assertNotContains(self.client.get(FOLLOW_INDEX), 'Пост 1')
+
+    def test_unfollow_trims_feed(self):
+        """Отписка убирает посты автора из ленты"""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        follow.delete()
+        self.assertFalse(FeedItem.objects.filter(user=self.reader).exists())
+
+    @override_settings(FEED_MAX_LENGTH=2)
+    def test_feed_is_capped(self):
+        """Лента хранит не больше FEED_MAX_LENGTH записей"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=str(i), author=self.author)
+                 for i in range(3)]
+        self.assertEqual(
+            set(FeedItem.objects.filter(
+                user=self.reader).values_list('post', flat=True)),
+            {posts[1].id, posts[2].id})
+
+    def test_fan_out_trims_feeds_at_once(self):
+        """Раскладка поста обрезает ленты всех подписчиков одним запросом"""
+        readers = [User.objects.create_user(username=f'Reader{number}')
+                   for number in range(10)]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=self.author) for reader in readers)
+        Post.objects.create(text='Первый пост', author=self.author)
+        post = Post.objects.create(text='Второй пост', author=self.author)
+        FeedItem.objects.filter(post=post).delete()
+        with self.settings(FEED_MAX_LENGTH=1), self.assertNumQueries(5):
+            fan_out_post(post)
+        self.assertEqual(
+            set(FeedItem.objects.filter(user__in=readers).values_list(
+                'user', 'post')),
+            {(reader.id, post.id) for reader in readers})
+
+    def test_rebuild_feeds_command(self):
+        """Команда rebuild_feeds восстанавливает ленты по подпискам"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedItem.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertTrue(FeedItem.objects.filter(
+            user=self.reader, post=self.old_post).exists())
@@ -0,0 +1,152 @@
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..images import variant_formats, variant_name
+from ..models import Post, User
+from ..thumbnails import cached_thumbnail
+
+INDEX_URL = reverse('posts:index')
+POST_CREATE_URL = reverse('posts:post_create')
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+EXIF_ORIENTATION = 0x0112
+ROTATED_90 = 6
+RED = '#ff0000'
+
+
+def image_upload(name, size, image_format='PNG', mode='RGBA', exif=None):
+    buffer = BytesIO()
+    image = Image.new(mode, size, 'red')
+    if exif is not None:
+        image.save(buffer, image_format, exif=exif)
+    else:
+        image.save(buffer, image_format)
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), f'image/{image_format.lower()}')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   IMAGE_MAX_SIZE=100)
+class ImageNormalizationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def create_post(self, upload):
+        self.client.post(POST_CREATE_URL, {'text': 'Пост', 'image': upload})
+        return Post.objects.latest('pk')
+
+    def run_on_commit(self):
+        """TestCase не коммитит транзакцию: вызываем отложенное вручную."""
+        callbacks = connection.run_on_commit
+        connection.run_on_commit = []
+        for _, callback in callbacks:
+            callback()
+
+    def test_upload_is_normalized(self):
+        """Загрузка уменьшается и сохраняется JPEG без метаданных"""
+        post = self.create_post(image_upload('photo.png', (400, 200)))
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with post.image.open() as file, Image.open(file) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (100, 50))
+
+    def test_upload_is_rotated_by_exif(self):
+        """Картинка поворачивается по EXIF, а сам EXIF отбрасывается"""
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = ROTATED_90
+        post = self.create_post(image_upload(
+            'photo.jpg', (80, 40), 'JPEG', 'RGB', exif=exif))
+        with post.image.open() as file, Image.open(file) as image:
+            self.assertEqual(image.size, (40, 80))
+            self.assertNotIn(EXIF_ORIENTATION, image.getexif())
+
+    def test_truncated_upload_rejected(self):
+        """Обрезанный JPEG не роняет страницу, а даёт ошибку формы"""
+        upload = image_upload('photo.jpg', (400, 200), 'JPEG', 'RGB')
+        content = upload.read()
+        truncated = SimpleUploadedFile(
+            'photo.jpg', content[:len(content) // 2], 'image/jpeg')
+        posts_count = Post.objects.count()
+        response = self.client.post(
+            POST_CREATE_URL, {'text': 'Пост', 'image': truncated})
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(
+            response, 'form', 'image', 'Файл повреждён или это не картинка.')
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    def test_variants_written_and_rendered(self):
+        """Воркер пишет варианты миниатюр, страница выводит <picture>"""
+        post = self.create_post(image_upload('photo.png', (400, 200)))
+        self.run_on_commit()
+        post.refresh_from_db()
+        formats = variant_formats()
+        self.assertEqual(post.image_formats, ','.join(formats))
+        card = cached_thumbnail(post.image, 'card')
+        response = self.client.get(INDEX_URL)
+        self.assertContains(response, f'{card.url} 960w')
+        for image_format in formats:
+            with self.subTest(image_format=image_format):
+                self.assertTrue(default_storage.exists(
+                    variant_name(card.name, image_format)))
+                self.assertContains(
+                    response, f'type="image/{image_format}"')
+
+    def test_upload_records_metadata(self):
+        """Размеры и цвет заглушки записываются при загрузке"""
+        post = self.create_post(image_upload('photo.png', (400, 200)))
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_placeholder),
+            (100, 50, RED))
+        self.assertContains(
+            self.client.get(INDEX_URL),
+            f'aspect-ratio: 100 / 50; background-color: {RED}')
+
+    def test_backfill_image_metadata(self):
+        """backfill_image_metadata заполняет поля старых постов"""
+        post = Post.objects.create(
+            text='Старый пост', author=self.user,
+            image=image_upload('old.png', (30, 20)))
+        missing = Post.objects.create(
+            text='Без файла', author=self.user, image='posts/missing.png')
+        connection.run_on_commit = []
+        self.assertContains(self.client.get(INDEX_URL), 'aspect-ratio: 2 / 1')
+        out = StringIO()
+        call_command('backfill_image_metadata', stdout=out)
+        self.assertIn('Заполнено постов: 1, пропущено картинок: 1',
+                      out.getvalue())
+        post.refresh_from_db()
+        missing.refresh_from_db()
+        self.assertEqual(
+            (post.image_width, post.image_height, post.image_placeholder),
+            (30, 20, RED))
+        self.assertIsNone(missing.image_width)
+        self.assertContains(
+            self.client.get(INDEX_URL), 'aspect-ratio: 30 / 20')
+
+    def test_worker_fills_missing_metadata(self):
+        """Воркер миниатюр дописывает поля постам, сохранённым без формы"""
+        post = Post.objects.create(
+            text='Из админки', author=self.user,
+            image=image_upload('admin.png', (30, 20)))
+        self.run_on_commit()
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (30, 20))
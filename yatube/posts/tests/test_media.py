@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils.http import http_date, parse_http_date
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+HASHED_NAME = 'posts/ab/cd/abcd' + '0' * 60 + '.jpg'
+PLAIN_NAME = 'posts/photo.jpg'
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ServeMediaTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (HASHED_NAME, PLAIN_NAME):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, name, **headers):
+        return self.client.get(settings.MEDIA_URL + name, **headers)
+
+    def test_file_served_with_cache_headers(self):
+        """Файл отдаётся с типом, ETag и заголовками кэширования"""
+        response = self.get(PLAIN_NAME)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('immutable', self.get(HASHED_NAME)['Cache-Control'])
+
+    def test_conditional_requests(self):
+        """Повторный запрос с ETag или датой получает 304"""
+        response = self.get(PLAIN_NAME)
+        for headers in (
+                {'HTTP_IF_NONE_MATCH': response['ETag']},
+                {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.get(PLAIN_NAME, **headers).status_code, 304)
+
+    def test_range_requests(self):
+        """Range отдаёт запрошенную часть файла"""
+        cases = (
+            ('bytes=10-19', 'bytes 10-19/1024', CONTENT[10:20]),
+            ('bytes=1000-', 'bytes 1000-1023/1024', CONTENT[1000:]),
+            ('bytes=-4', 'bytes 1020-1023/1024', CONTENT[-4:]),
+        )
+        for header, content_range, content in cases:
+            with self.subTest(header=header):
+                response = self.get(PLAIN_NAME, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(
+                    int(response['Content-Length']), len(content))
+                self.assertEqual(
+                    b''.join(response.streaming_content), content)
+
+    def test_unsatisfiable_and_stale_ranges(self):
+        """Диапазон за концом файла — 416, устаревший If-Range — весь файл"""
+        self.assertEqual(
+            self.get(PLAIN_NAME, HTTP_RANGE='bytes=5000-').status_code, 416)
+        response = self.get(
+            PLAIN_NAME, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_range_compared_strongly(self):
+        """If-Range отдаёт диапазон только при строгом совпадении"""
+        full = self.get(PLAIN_NAME)
+        etag, modified = full['ETag'], full['Last-Modified']
+        later = http_date(parse_http_date(modified) + 60)
+        cases = (
+            (etag, 206),
+            (modified, 206),
+            (f'W/{etag}', 200),
+            (later, 200),
+        )
+        for if_range, status in cases:
+            with self.subTest(if_range=if_range):
+                response = self.get(
+                    PLAIN_NAME, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, status)
+
+    def test_missing_and_outside_files(self):
+        """Нет файла или путь ведёт за MEDIA_ROOT — 404"""
+        for name in ('posts/missing.jpg', 'posts', '../settings.py'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+    def test_sendfile_offload(self):
+        """С MEDIA_SENDFILE файл отдаёт веб-сервер"""
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.get(HASHED_NAME)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            settings.MEDIA_ACCEL_PREFIX + HASHED_NAME)
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.get(PLAIN_NAME)
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(TEMP_MEDIA_ROOT, PLAIN_NAME))
@@ -0,0 +1,65 @@
+import re
+import shutil
+import tempfile
+import tracemalloc
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import reset
+from ..models import Post, User
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('metrics')
+TEMP_METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEMORY_TRACING=True, MEMORY_BUDGET=0, METRICS_FLUSH_INTERVAL=0,
+    METRICS_DIR=TEMP_METRICS_DIR, METRICS_TOKEN='test-scrape-token')
+class MemoryAccountingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='TestAuthor')
+        Post.objects.create(text='Тестовый пост', author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        tracemalloc.stop()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        reset()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def test_peak_in_server_timing_and_metrics(self):
+        """Пик памяти запроса виден в Server-Timing и /metrics"""
+        with self.assertLogs('yatube.memory', 'WARNING'):
+            response = self.client.get(INDEX_URL)
+            text = self.client.get(
+                METRICS_URL,
+                HTTP_AUTHORIZATION='Bearer test-scrape-token',
+            ).content.decode()
+        self.assertRegex(response['Server-Timing'], r'mem;desc="peak [\d.]+')
+        for name in ('yatube_memory_peak_bytes_count',
+                     'yatube_memory_budget_exceeded_total'):
+            with self.subTest(name=name):
+                self.assertRegex(
+                    text, rf'(?m)^{name}{{view="posts:index"}} 1$')
+
+    def test_memory_report_command(self):
+        """memory_report показывает худший запрос и места выделения"""
+        with self.assertLogs('yatube.memory', 'WARNING'):
+            self.client.get(INDEX_URL)
+        # Команда запускается отдельным процессом со своими счётчиками.
+        reset()
+        out = StringIO()
+        call_command('memory_report', stdout=out)
+        report = out.getvalue()
+        self.assertIn('posts:index: худший пик', report)
+        self.assertIn(INDEX_URL, report)
+        self.assertTrue(re.search(r'^ +\S+:\d+: ', report, re.MULTILINE))
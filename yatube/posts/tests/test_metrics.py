@@ -0,0 +1,111 @@
+import multiprocessing
+import re
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import RequestStats, flush, record_request, reset
+from ..models import Post, User
+
+INDEX_URL = reverse('posts:index')
+METRICS_URL = reverse('metrics')
+TEMP_METRICS_DIR = tempfile.mkdtemp()
+TOKEN = 'test-scrape-token'
+
+
+def request_in_other_worker():
+    record_request('posts:index', RequestStats(None), 0.001, 100)
+    flush(force=True)
+
+
+@override_settings(METRICS_FLUSH_INTERVAL=0, METRICS_DIR=TEMP_METRICS_DIR,
+                   METRICS_TOKEN=TOKEN)
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='TestAuthor')
+        Post.objects.create(text='Тестовый пост', author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        # Запросы прошлых тестов остались в счётчиках процесса.
+        reset()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def scrape(self, token=TOKEN):
+        return self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def metric(self, text, name, view):
+        match = re.search(
+            rf'^{name}{{view="{view}"}} (\S+)$', text, re.MULTILINE)
+        self.assertIsNotNone(match, f'{name} для {view} нет в /metrics')
+        return float(match.group(1))
+
+    def test_server_timing_header(self):
+        """Ответ несёт Server-Timing с SQL, шаблонами и общим временем"""
+        timing = self.client.get(INDEX_URL)['Server-Timing']
+        for part in ('db;dur=', 'SQL', 'tpl;dur=', 'cache;desc=',
+                     'total;dur='):
+            with self.subTest(part=part):
+                self.assertIn(part, timing)
+
+    def test_metrics_aggregated_by_view(self):
+        """/metrics показывает гистограммы и счётчики по имени view"""
+        for _ in range(2):
+            self.client.get(INDEX_URL)
+        text = self.scrape().content.decode()
+        view = 'posts:index'
+        self.assertEqual(
+            self.metric(text, 'yatube_request_duration_seconds_count', view),
+            2)
+        self.assertIn(
+            f'yatube_request_duration_seconds_bucket{{view="{view}",'
+            f'le="+Inf"}} 2', text)
+        self.assertGreater(
+            self.metric(text, 'yatube_db_queries_total', view), 0)
+        self.assertGreater(
+            self.metric(text, 'yatube_template_duration_seconds_sum', view),
+            0)
+        self.assertGreater(
+            self.metric(text, 'yatube_response_bytes_total', view), 0)
+
+    def test_metrics_summed_across_processes(self):
+        """/metrics складывает запросы всех процессов без двойного счёта"""
+        self.client.get(INDEX_URL)
+        # Ответвлённый процесс наследует счётчики этого: они не должны
+        # попасть в его файл второй раз.
+        worker = multiprocessing.get_context('fork').Process(
+            target=request_in_other_worker)
+        worker.start()
+        worker.join()
+        self.assertEqual(worker.exitcode, 0)
+        text = self.scrape().content.decode()
+        self.assertEqual(
+            self.metric(
+                text, 'yatube_request_duration_seconds_count', 'posts:index'),
+            2)
+
+    def test_metrics_need_token(self):
+        """/metrics закрыт без токена, даже с адреса прокси"""
+        cases = (
+            ('без токена', self.client.get(
+                METRICS_URL, REMOTE_ADDR='127.0.0.1')),
+            ('чужой токен', self.scrape('wrong-token')),
+        )
+        for case, response in cases:
+            with self.subTest(case=case):
+                self.assertEqual(response.status_code, 403)
+
+    def test_metrics_for_staff(self):
+        """Сотрудник видит /metrics без токена"""
+        self.client.force_login(
+            User.objects.create_user(username='TestStaff', is_staff=True))
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 200)
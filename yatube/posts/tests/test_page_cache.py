@@ -0,0 +1,175 @@
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..holes import shared_page
+from ..models import Comment, Follow, Group, Post, User
+from ..surrogate import INDEX
+
+INDEX_URL = reverse('posts:index')
+SLUG = 'test-slug'
+GROUP_URL = reverse('posts:group_list', kwargs={'slug': SLUG})
+AUTHOR = 'TestAuthor'
+PROFILE_URL = reverse('posts:profile', kwargs={'username': AUTHOR})
+SEARCH_URL = reverse('posts:search')
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug=SLUG,
+            description='Тестовое описание')
+        cls.post = Post.objects.create(
+            text='Тестовый пост', author=cls.author, group=cls.group)
+        cls.POST_DETAIL_URL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def is_cached(self, url):
+        return self.queries(url)[0] == 0
+
+    def test_anonymous_pages_cached(self):
+        """Повторный анонимный запрос отдаётся из кэша без запросов"""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL, self.POST_DETAIL_URL):
+            first = self.client.get(url)
+            with self.subTest(url=url):
+                count, response = self.queries(url)
+                self.assertEqual(count, 0)
+                self.assertEqual(response.content, first.content)
+                self.assertEqual(
+                    response['Surrogate-Key'], first['Surrogate-Key'])
+
+    def test_cached_page_answers_conditional_get(self):
+        """Закэшированная страница отвечает 304 на свой ETag и дату"""
+        first = self.client.get(INDEX_URL)
+        response = self.client.get(
+            INDEX_URL, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            INDEX_URL, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Last-Modified'], first['Last-Modified'])
+
+    def test_writes_purge_affected_pages(self):
+        """Запись сбрасывает только затронутые ей страницы"""
+        writes = (
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.author, text='Комментарий'),
+             [self.POST_DETAIL_URL], [INDEX_URL, GROUP_URL, PROFILE_URL]),
+            (lambda: Follow.objects.create(
+                user=User.objects.create_user(username='Reader'),
+                author=self.author),
+             [PROFILE_URL, self.POST_DETAIL_URL], [INDEX_URL, GROUP_URL]),
+            (lambda: Post.objects.create(
+                text='Чужой пост',
+                author=User.objects.create_user(username='Other')),
+             [INDEX_URL], [GROUP_URL, PROFILE_URL, self.POST_DETAIL_URL]),
+        )
+        for write, purged, kept in writes:
+            for url in (*purged, *kept):
+                self.client.get(url)
+            write()
+            for url in purged:
+                with self.subTest(url=url):
+                    self.assertFalse(self.is_cached(url))
+            for url in kept:
+                with self.subTest(url=url):
+                    self.assertTrue(self.is_cached(url))
+
+    def test_unknown_params_share_cached_page(self):
+        """Лишние параметры запроса не плодят копии страницы в кэше"""
+        self.client.get(INDEX_URL + '?page=1')
+        self.assertTrue(self.is_cached(INDEX_URL + '?utm_source=mail&page=1'))
+        self.assertFalse(self.is_cached(INDEX_URL + '?page=2'))
+
+    def test_logged_in_and_other_pages_not_cached(self):
+        """Страницы пользователей и страницы без ключей не кэшируются"""
+        search_url = f'{SEARCH_URL}?q=пост'
+        self.client.get(search_url)
+        self.assertFalse(self.is_cached(search_url))
+        self.client.force_login(self.author)
+        self.client.get(INDEX_URL)
+        self.assertFalse(self.is_cached(INDEX_URL))
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class SharedPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.other = User.objects.create_user(username='Other')
+        cls.post = Post.objects.create(text='Тестовый пост', author=cls.author)
+        cls.POST_DETAIL_URL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+
+    def get_as(self, user, url):
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries.captured_queries]
+
+    def test_shared_body_rendered_once(self):
+        """Список постов рендерится один раз для всех пользователей"""
+        self.get_as(self.reader, PROFILE_URL)
+        response, queries = self.get_as(self.other, PROFILE_URL)
+        self.assertFalse(
+            [sql for sql in queries if 'posts_post' in sql])
+        self.assertContains(response, 'Тестовый пост')
+        self.assertContains(response, '>Other</a>')
+        self.assertNotContains(response, '>Reader</a>')
+
+    def test_holes_are_personal(self):
+        """Кнопка подписки и форма комментария свои у каждого"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        response, _ = self.get_as(self.reader, PROFILE_URL)
+        self.assertContains(response, 'Отписаться')
+        response, _ = self.get_as(self.other, PROFILE_URL)
+        self.assertContains(response, 'Подписаться')
+        response, _ = self.get_as(self.author, PROFILE_URL)
+        self.assertNotContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Отписаться')
+        for user in (self.reader, self.other):
+            response, _ = self.get_as(user, self.POST_DETAIL_URL)
+            with self.subTest(user=user):
+                self.assertContains(response, 'csrfmiddlewaretoken')
+                self.assertNotContains(response, '<!--hole:')
+
+    def test_shared_body_follows_writes(self):
+        """Общая часть сбрасывается записью в её ключи"""
+        self.get_as(self.reader, self.POST_DETAIL_URL)
+        Comment.objects.create(
+            post=self.post, author=self.other, text='Новый комментарий')
+        response, _ = self.get_as(self.reader, self.POST_DETAIL_URL)
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_shared_body_keeps_headers(self):
+        """Страница из общего кэша отдаётся с заголовками view"""
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            response = HttpResponse('Общая страница')
+            response['Cache-Control'] = 'private, max-age=60'
+            return response
+
+        page = shared_page(view, {INDEX: 1})
+        for user in (self.reader, self.other):
+            request = RequestFactory().get(INDEX_URL)
+            request.user = user
+            response = page(request)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(response['Cache-Control'], 'private, max-age=60')
+        self.assertEqual(response.content.decode(), 'Общая страница')
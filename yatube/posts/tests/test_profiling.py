@@ -0,0 +1,79 @@
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.profiling import WindowSampler
+from ..models import Post, User
+
+TEMP_PROFILE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+INDEX_URL = reverse('posts:index')
+
+
+@override_settings(PROFILE_DIR=TEMP_PROFILE_DIR)
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True)
+        Post.objects.create(text='Тестовый пост', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILE_DIR, ignore_errors=True)
+
+    def test_staff_request_profiled(self):
+        """Запрос сотрудника с ?profile=1 оставляет pstats и flamegraph"""
+        self.client.force_login(self.staff)
+        response = self.client.get(INDEX_URL, {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        base = os.path.join(TEMP_PROFILE_DIR, response['X-Profile'])
+        stats = pstats.Stats(base + '.prof')
+        self.assertTrue(any(
+            function == 'index' for _, _, function in stats.stats))
+        with open(base + '.folded', encoding='utf-8') as file:
+            for line in file:
+                stack, count = line.rsplit(' ', 1)
+                self.assertTrue(stack.startswith('posts:index;'))
+                self.assertTrue(count.strip().isdigit())
+
+    def test_header_switch(self):
+        """Профилирование включается и заголовком X-Profile"""
+        self.client.force_login(self.staff)
+        response = self.client.get(INDEX_URL, HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile', response)
+
+    def test_not_profiled(self):
+        """Обычный пользователь и чужие приложения не профилируются"""
+        cases = (
+            (self.user, INDEX_URL),
+            (self.staff, reverse('admin:index')),
+        )
+        for user, url in cases:
+            with self.subTest(user=user.username, url=url):
+                self.client.force_login(user)
+                response = self.client.get(url, {'profile': '1'})
+                self.assertNotIn('X-Profile', response)
+
+    def test_window_sampler_groups_stacks_by_view(self):
+        """Непрерывный сэмплер пишет стеки с именем view в корне"""
+        sampler = WindowSampler(interval=1, window=0)
+        sampler.threads = {threading.get_ident(): 'posts:index'}
+        sampler.sample()
+        names = [
+            name for name in os.listdir(TEMP_PROFILE_DIR)
+            if name.startswith('sampling-')
+        ]
+        self.assertEqual(len(names), 1)
+        with open(os.path.join(TEMP_PROFILE_DIR, names[0])) as file:
+            stack = file.readline()
+        self.assertTrue(stack.startswith('posts:index;'))
+        self.assertIn('test_window_sampler_groups_stacks_by_view', stack)
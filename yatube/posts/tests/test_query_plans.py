@@ -0,0 +1,108 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from yatube.settings import COMMENTS_PAGINATOR_COUNT, PAGINATOR_COUNT
+from ..models import Comment, Follow, Group, Post, User
+
+SLUG = 'test-slug'
+AUTHOR = 'TestAuthor'
+READER = 'Reader'
+INDEX_URL = reverse('posts:index')
+GROUP_URL = reverse('posts:group_list', kwargs={'slug': SLUG})
+PROFILE_URL = reverse('posts:profile', kwargs={'username': AUTHOR})
+FOLLOW_INDEX = reverse('posts:follow_index')
+# Полный проход по таблице без индекса и сортировка во временном B-дереве;
+# формат вывода отличается в старых и новых версиях SQLite. Проход по
+# подзапросу COUNT(*) не в счёт: его собственные шаги проверяются отдельно.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?!subquery)\w+( AS \w+)?$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username=READER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(PAGINATOR_COUNT + 1):
+            cls.post = Post.objects.create(
+                text=f'Пост {number}', author=cls.author, group=cls.group)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PAGINATOR_COUNT + 1))
+        cls.POST_DETAIL_URL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+        cls.POST_COMMENTS_URL = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def plans(self, url):
+        """Планы всех SELECT, которые делает страница: {sql: [шаги]}."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        plans = {}
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans[query['sql']] = [row[-1] for row in cursor.fetchall()]
+        return response, plans
+
+    def assertIndexedPlans(self, url):
+        response, plans = self.plans(url)
+        for sql, steps in plans.items():
+            for step in steps:
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN.match(step))
+                    self.assertNotIn(TEMP_SORT, step)
+        return response
+
+    def assertCursorPlans(self, url):
+        """Проверяет страницу и её страницы по курсорам вперёд и назад."""
+        page = self.assertIndexedPlans(url).context['page_obj']
+        self.assertIsNotNone(page.next_cursor)
+        page = self.assertIndexedPlans(
+            f'{url}?cursor={page.next_cursor}').context['page_obj']
+        self.assertIndexedPlans(f'{url}?cursor={page.previous_cursor}')
+
+    def test_post_lists_use_indexes(self):
+        """Ленты постов читаются по индексам без сортировки"""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL, FOLLOW_INDEX):
+            with self.subTest(url=url):
+                self.assertCursorPlans(url)
+                self.assertIndexedPlans(f'{url}?page=2')
+
+    def test_comments_use_indexes(self):
+        """Комментарии поста читаются по индексу без сортировки"""
+        self.assertIndexedPlans(self.POST_DETAIL_URL)
+        page = self.client.get(self.POST_DETAIL_URL).context['comments']
+        self.assertIndexedPlans(
+            f'{self.POST_COMMENTS_URL}?cursor={page.next_cursor}')
+
+    def test_follow_lookup_uses_unique_index(self):
+        """Проверка подписки ищет по уникальному индексу (user, author)"""
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + str(Follow.objects.filter(
+                user=self.reader, author=self.author).query))
+            steps = [row[-1] for row in cursor.fetchall()]
+        self.assertTrue(
+            any('(user_id=? AND author_id=?)' in step for step in steps),
+            steps)
@@ -12,6 +12,7 @@ class TestRoutes(TestCase):
             ['post_create', None, '/create/'],
             ['post_detail', [ID], f'/posts/{ID}/'],
             ['post_edit', [ID], f'/posts/{ID}/edit/'],
+            ['post_comments', [ID], f'/posts/{ID}/comments/'],
             ['follow_index', None, '/follow/'],
             ['profile_follow', [USERNAME], f'/profile/{USERNAME}/follow/'],
             ['profile_unfollow', [USERNAME], f'/profile/{USERNAME}/unfollow/']
@@ -0,0 +1,100 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from yatube.settings import PAGINATOR_COUNT
+from ..models import Post, User
+
+SEARCH_URL = reverse('posts:search')
+SEARCH_JSON_URL = reverse('posts:search_json')
+ADMIN_URL = reverse('admin:posts_post_changelist')
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.post = Post.objects.create(
+            text='Кошка спит на <b>тёплом</b> подоконнике',
+            author=cls.author)
+        cls.other = Post.objects.create(
+            text='Собака гуляет во дворе', author=cls.author)
+
+    def search(self, query, **params):
+        return self.client.get(SEARCH_URL, {'q': query, **params})
+
+    def test_search_finds_posts(self):
+        """Поиск находит посты по словам и началу слова"""
+        for query in ('кошка', 'КОШКА подоконнике', 'подокон'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    list(self.search(query).context['page_obj']),
+                    [self.post])
+
+    def test_search_follows_post_changes(self):
+        """Индекс следует за правкой и удалением постов"""
+        Post.objects.filter(pk=self.other.pk).update(text='Кошка во дворе')
+        self.assertEqual(len(self.search('кошка').context['page_obj']), 2)
+        Post.objects.filter(pk=self.other.pk).delete()
+        self.assertEqual(
+            list(self.search('кошка').context['page_obj']), [self.post])
+
+    def test_search_snippet_is_escaped(self):
+        """Сниппет подсвечивает совпадение и экранирует HTML поста"""
+        response = self.search('тёплом')
+        self.assertContains(response, '<mark>тёплом</mark>')
+        self.assertNotContains(response, '<b>')
+
+    def test_search_ignores_query_syntax(self):
+        """Операторы FTS5 в запросе не ломают поиск"""
+        for query in ('"', 'NEAR(', '*', 'кошка OR'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query).status_code, 200)
+
+    def test_search_pages_by_cursor(self):
+        """Результаты листаются курсором без повторов"""
+        Post.objects.bulk_create(
+            Post(text=f'Поиск {number}', author=self.author)
+            for number in range(PAGINATOR_COUNT + 3))
+        first = self.search('поиск').context['page_obj']
+        self.assertEqual(len(first), PAGINATOR_COUNT)
+        second = self.search(
+            'поиск', cursor=first.next_cursor).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertIsNone(second.next_cursor)
+        self.assertFalse(set(first) & set(second))
+
+    def test_search_json(self):
+        """JSON-поиск отдаёт результаты и курсор"""
+        data = self.client.get(SEARCH_JSON_URL, {'q': 'собака'}).json()
+        self.assertEqual(
+            [result['id'] for result in data['results']], [self.other.id])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по полнотекстовому индексу"""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(ADMIN_URL, {'q': 'собака'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other])
+
+    def test_search_after_all_migrations(self):
+        """Триггеры поиска переживают миграции, пересоздающие posts_post"""
+        Post.objects.bulk_create(
+            [Post(text='Ежик шуршит в листве', author=self.author)])
+        post = Post.objects.get(text__startswith='Ежик')
+        self.assertEqual(
+            list(self.search('ежик').context['page_obj']), [post])
+        Post.objects.filter(pk=post.pk).update(text='Ежик спит')
+        self.assertFalse(self.search('шуршит').context['page_obj'])
+
+    def test_rebuild_search_index(self):
+        """rebuild_search_index подхватывает посты, записанные мимо индекса"""
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(
+            list(self.search('собака').context['page_obj']), [self.other])
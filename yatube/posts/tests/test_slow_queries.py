@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.slow_queries import JsonFormatter, fingerprint, logger
+from ..models import Post, User
+
+TEMP_LOG_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_LOG = os.path.join(TEMP_LOG_DIR, 'slow_queries.log')
+INDEX_URL = reverse('posts:index')
+PROFILE_URL = reverse('posts:profile', args=['TestAuthor'])
+SLOW_QUERIES_URL = reverse('slow_queries')
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=TEMP_LOG)
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+        cls.staff = User.objects.create_user(
+            username='TestStaff', is_staff=True)
+        Post.objects.create(text='Тестовый пост', author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def setUp(self):
+        handler = RotatingFileHandler(TEMP_LOG, encoding='utf-8')
+        handler.setFormatter(JsonFormatter())
+        self.handlers, logger.handlers = logger.handlers, [handler]
+
+    def tearDown(self):
+        for handler in logger.handlers:
+            handler.close()
+        logger.handlers = self.handlers
+        if os.path.exists(TEMP_LOG):
+            os.remove(TEMP_LOG)
+
+    def records(self):
+        with open(TEMP_LOG, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_record_attributed_to_view_and_code(self):
+        """Запись журнала знает view и кадр кода, сделавший запрос"""
+        self.client.get(INDEX_URL)
+        records = [
+            record for record in self.records()
+            if record['view'] == 'posts:index'
+        ]
+        self.assertTrue(records)
+        for record in records:
+            with self.subTest(sql=record['sql']):
+                self.assertGreaterEqual(record['duration_ms'], 0)
+                self.assertTrue(record['frame'].startswith('posts'))
+
+    def test_template_line_recorded(self):
+        """Запрос из тега шаблона записан с именем шаблона и строкой"""
+        self.client.force_login(self.staff)
+        self.client.get(PROFILE_URL)
+        records = [
+            record for record in self.records()
+            if record['template'] and 'posts_follow' in record['sql']
+        ]
+        self.assertTrue(records)
+        name, line = records[0]['template'].rsplit(':', 1)
+        self.assertEqual(name, 'posts/profile.html')
+        self.assertTrue(line.isdigit())
+        self.assertIn('holes.py', records[0]['frame'])
+
+    def test_fingerprint_groups_arguments(self):
+        """Запросы с разными аргументами сводятся к одному отпечатку"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND s = 'a'"),
+            fingerprint("SELECT * FROM t WHERE id IN (7) AND s = 'b'"))
+
+    def test_admin_page_staff_only(self):
+        """Отчёт о медленных запросах доступен только сотрудникам"""
+        self.client.get(INDEX_URL)
+        self.client.force_login(self.author)
+        response = self.client.get(SLOW_QUERIES_URL)
+        self.assertEqual(response.status_code, 302)
+        self.client.force_login(self.staff)
+        response = self.client.get(SLOW_QUERIES_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['offenders'])
+        self.assertIn('posts:index', {
+            view for offender in response.context['offenders']
+            for view in offender['views']
+        })
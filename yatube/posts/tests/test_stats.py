@@ -0,0 +1,63 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Follow, Post, User
+from ..stats import stats_for
+
+AUTHOR = 'TestAuthor'
+READER = 'Reader'
+PROFILE_URL = reverse('posts:profile', kwargs={'username': AUTHOR})
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.reader = User.objects.create_user(username=READER)
+
+    def assertStats(self, user, posts, followers, following):
+        stats = AuthorStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following))
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами и подписками"""
+        post = Post.objects.create(text='Пост', author=self.author)
+        Post.objects.create(text='Ещё пост', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, 2, 1, 0)
+        self.assertStats(self.reader, 0, 0, 1)
+        post.delete()
+        follow.delete()
+        self.assertStats(self.author, 1, 0, 0)
+        self.assertStats(self.reader, 0, 0, 0)
+
+    def test_stats_without_row_are_counted(self):
+        """Без строки статистики счётчики считаются по таблицам и
+        сохраняются"""
+        Post.objects.bulk_create([Post(text='Пост', author=self.author)])
+        self.assertFalse(AuthorStats.objects.exists())
+        self.assertEqual(stats_for(self.author).posts_count, 1)
+        self.assertStats(self.author, 1, 0, 0)
+
+    def test_profile_shows_stats(self):
+        """Профиль выводит счётчики без COUNT(*)"""
+        Post.objects.create(text='Пост', author=self.author)
+        response = self.client.get(PROFILE_URL)
+        self.assertEqual(response.context['stats'].posts_count, 1)
+        self.assertContains(response, 'Всего постов: 1')
+
+    def test_reconcile_stats_fixes_drift(self):
+        """reconcile_stats исправляет расхождения счётчиков"""
+        Post.objects.create(text='Пост', author=self.author)
+        Post.objects.bulk_create([Post(text='Тихий пост', author=self.author)])
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        call_command('reconcile_stats', batch_size=1, stdout=StringIO())
+        self.assertStats(self.author, 2, 1, 0)
+        self.assertStats(self.reader, 0, 0, 1)
@@ -0,0 +1,114 @@
+import re
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from ..models import Post, User
+from ..thumbnails import cached_thumbnail
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\x00\xFF')
+SHARDED_NAME = re.compile(
+    r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.gif$')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0,
+                   MEDIA_RELEASE_GRACE=0)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, content=SMALL_GIF, name='small.gif'):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.author,
+            image=SimpleUploadedFile(name, content, 'image/gif'))
+
+    def run_on_commit(self):
+        """TestCase не коммитит транзакцию: вызываем отложенное вручную."""
+        callbacks = connection.run_on_commit
+        connection.run_on_commit = []
+        for _, callback in callbacks:
+            callback()
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки делят один файл с именем по хэшу"""
+        first = self.create_post(name='first.gif')
+        second = self.create_post(name='second.gif')
+        self.assertRegex(first.image.name, SHARDED_NAME)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(
+            self.create_post(OTHER_GIF).image.name, first.image.name)
+
+    def test_file_deleted_with_last_reference(self):
+        """Файл и миниатюры удаляются вместе с последним постом"""
+        first = self.create_post()
+        second = self.create_post()
+        self.run_on_commit()
+        name = first.image.name
+        thumbnail = cached_thumbnail(name, 'card')
+        first.delete()
+        self.run_on_commit()
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.run_on_commit()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        self.assertIsNone(cached_thumbnail(name, 'card'))
+
+    def test_replaced_image_released(self):
+        """Заменённая картинка удаляется, если больше никому не нужна"""
+        post = self.create_post()
+        name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', OTHER_GIF, 'image/gif')
+        post.save()
+        self.run_on_commit()
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_recently_reused_file_kept(self):
+        """Только что переиспользованный файл не удаляется"""
+        post = self.create_post()
+        with self.settings(MEDIA_RELEASE_GRACE=60):
+            post.delete()
+            self.run_on_commit()
+        self.assertTrue(default_storage.exists(post.image.name))
+
+    def test_sweep_removes_file_kept_as_recent(self):
+        """Файл, оставленный как недавно переиспользованный, удаляет
+        sweep_images, а нужные постам файлы не трогает"""
+        kept = self.create_post(OTHER_GIF)
+        post = self.create_post()
+        self.run_on_commit()
+        thumbnail = cached_thumbnail(post.image.name, 'card')
+        with self.settings(MEDIA_RELEASE_GRACE=60):
+            post.delete()
+            self.run_on_commit()
+            call_command('sweep_images', stdout=StringIO())
+        self.assertTrue(default_storage.exists(post.image.name))
+        out = StringIO()
+        call_command('sweep_images', stdout=out)
+        self.assertIn('Удалено картинок: 1', out.getvalue())
+        self.assertFalse(default_storage.exists(post.image.name))
+        self.assertFalse(default_storage.exists(thumbnail.name))
+        self.assertTrue(default_storage.exists(kept.image.name))
@@ -0,0 +1,172 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures.process import BrokenProcessPool
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import thumbnails
+from ..cache import get_versions
+from ..models import Post, User
+from ..surrogate import INDEX
+from ..thumbnails import (attach_thumbnails, cached_thumbnail,
+                          delete_thumbnails, generate_thumbnails)
+
+INDEX_URL = reverse('posts:index')
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B')
+PLACEHOLDER = 'bg-light'
+KVSTORE_TABLE = 'thumbnail_kvstore'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestAuthor')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    def run_on_commit(self):
+        """TestCase не коммитит транзакцию: вызываем отложенное вручную."""
+        callbacks = connection.run_on_commit
+        connection.run_on_commit = []
+        for _, callback in callbacks:
+            callback()
+
+    def test_page_shows_placeholder_until_generated(self):
+        """До генерации миниатюры страница выводит заглушку"""
+        post = self.create_post()
+        response = self.client.get(INDEX_URL)
+        self.assertContains(response, PLACEHOLDER)
+        self.assertIsNone(cached_thumbnail(post.image, 'card'))
+
+    def test_thumbnail_generated_after_commit(self):
+        """Миниатюра создаётся после коммита и выводится на странице"""
+        post = self.create_post()
+        self.run_on_commit()
+        thumbnail = cached_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(self.client.get(INDEX_URL), thumbnail.url)
+
+    def test_missing_image_is_skipped(self):
+        """Пост с картинкой без файла не ломает генерацию"""
+        Post.objects.create(
+            text='Без файла', author=self.author, image='posts/missing.gif')
+        self.run_on_commit()
+        self.assertContains(self.client.get(INDEX_URL), PLACEHOLDER)
+
+    def test_pregenerate_thumbnails(self):
+        """pregenerate_thumbnails создаёт миниатюры старых постов"""
+        post = self.create_post()
+        connection.run_on_commit = []
+        out = StringIO()
+        call_command('pregenerate_thumbnails', workers=0, stdout=out)
+        self.assertIn('Обработано картинок: 1/1', out.getvalue())
+        self.assertIsNotNone(cached_thumbnail(post.image, 'card'))
+
+    def test_pages_purged_when_post_already_marked(self):
+        """Страница с заглушкой сбрасывается, даже если отмечать у поста
+        нечего"""
+        post = self.create_post()
+        self.run_on_commit()
+        url = cached_thumbnail(post.image, 'card').url
+        delete_thumbnails(post.image.name)
+        cache.clear()
+        self.assertNotContains(self.client.get(INDEX_URL), url)
+        generate_thumbnails(post.image.name)
+        self.assertContains(self.client.get(INDEX_URL), url)
+
+    def kvstore_queries(self, action):
+        with CaptureQueriesContext(connection) as queries:
+            action()
+        return [query for query in queries.captured_queries
+                if KVSTORE_TABLE in query['sql']]
+
+    def test_page_thumbnails_resolved_at_once(self):
+        """Миниатюры страницы ищутся одним запросом, затем из кэша"""
+        for _ in range(3):
+            self.create_post()
+        self.run_on_commit()
+        cache.clear()
+        posts = list(Post.objects.all())
+        self.assertEqual(
+            len(self.kvstore_queries(lambda: attach_thumbnails(posts))), 1)
+        for post in posts:
+            self.assertIsNotNone(post.thumbnails['card'])
+        self.assertFalse(
+            self.kvstore_queries(lambda: self.client.get(INDEX_URL)))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=1)
+class ThumbnailPoolTest(TransactionTestCase):
+    """Посты коммитятся: колбэк пула пишет в базу из своего потока."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Картинка та же, что в тестах выше: их записи в кэше sorl
+        # переживают очистку базы.
+        cache.clear()
+
+    def tearDown(self):
+        if thumbnails._pool is not None:
+            thumbnails._pool.shutdown()
+            thumbnails._pool = None
+
+    def test_pool_result_reaches_pages(self):
+        """Миниатюра из пула процессов сбрасывает кэш страниц родителя"""
+        author = User.objects.create_user(username='TestAuthor')
+        post = Post.objects.create(
+            text='Пост с картинкой', author=author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        self.assertContains(self.client.get(INDEX_URL), PLACEHOLDER)
+        before = get_versions(INDEX)
+        thumbnails._pool.shutdown()
+        thumbnails._pool = None
+        self.assertNotEqual(get_versions(INDEX), before)
+        thumbnail = cached_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        self.assertContains(self.client.get(INDEX_URL), thumbnail.url)
+
+    def test_broken_pool_recreated(self):
+        """Пул, в котором умер воркер, создаётся заново, и задача
+        выполняется"""
+        thumbnails._pool = thumbnails.pool()
+        crash = thumbnails._pool.submit(os._exit, 1)
+        with self.assertRaises(BrokenProcessPool):
+            crash.result()
+        author = User.objects.create_user(username='TestAuthor')
+        with self.assertLogs('yatube.thumbnails', 'WARNING'):
+            post = Post.objects.create(
+                text='Пост с картинкой', author=author,
+                image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        thumbnails._pool.shutdown()
+        thumbnails._pool = None
+        self.assertIsNotNone(cached_thumbnail(post.image, 'card'))
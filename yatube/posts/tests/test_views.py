@@ -1,9 +1,18 @@
+import shutil
+import tempfile
+from io import StringIO
+
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from yatube.settings import PAGINATOR_COUNT
-from ..models import Follow, Group, Post, User
+from core.metrics import reset
+from yatube.settings import COMMENTS_PAGINATOR_COUNT, PAGINATOR_COUNT
+from ..cache import fragment_stats
+from ..models import Comment, Follow, Group, Post, User
 
 
 INDEX_URL = reverse('posts:index')
@@ -19,8 +28,10 @@ PROFILE_URL = reverse('posts:profile', kwargs={'username': AUTHOR})
 FOLLOW_INDEX = reverse('posts:follow_index')
 FOLLOW = reverse('posts:profile_follow', kwargs={'username': PUBLISHER})
 UNFOLLOW = reverse('posts:profile_unfollow', kwargs={'username': PUBLISHER})
+TEMP_METRICS_DIR = tempfile.mkdtemp()
 
 
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR)
 class PostPagesTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -58,6 +69,11 @@ class PostPagesTest(TestCase):
         cls.POST_DETAIL_URL = reverse(
             'posts:post_detail', kwargs={'post_id': cls.post.id})
 
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
     def test_post_shows_on_page(self):
         """Пост отображается на странице"""
         page_urls = [
@@ -108,13 +124,64 @@ class PostPagesTest(TestCase):
     def test_cache_index_page(self):
         """Тест кэша"""
         posts_before = self.logged_user.get(INDEX_URL).content
-        Post.objects.all().delete()
+        Post.objects.all().update(text='Правка в обход сигналов')
         posts_after = self.logged_user.get(INDEX_URL).content
         self.assertTrue(posts_before == posts_after)
         cache.clear()
         posts_after_clear_cache = self.logged_user.get(INDEX_URL).content
         self.assertFalse(posts_before == posts_after_clear_cache)
 
+    def test_index_cache_follows_content_generation(self):
+        """Запись поста сбрасывает кэш главной страницы"""
+        hits, misses = fragment_stats('index_page')['index_page']
+        posts_before = self.logged_user.get(INDEX_URL).content
+        self.assertEqual(
+            self.logged_user.get(INDEX_URL).content, posts_before)
+        Post.objects.all().delete()
+        self.assertNotEqual(
+            self.logged_user.get(INDEX_URL).content, posts_before)
+        new_hits, new_misses = fragment_stats('index_page')['index_page']
+        self.assertGreaterEqual(new_hits - hits, 1)
+        self.assertGreaterEqual(new_misses - misses, 1)
+
+    def test_index_cache_key_ignores_query_string(self):
+        """Разные адреса одной страницы читают один фрагмент"""
+        cache.clear()
+        hits, misses = fragment_stats('index_page')['index_page']
+        for query in ('', '?page=1', '?page=abc', '?utm_source=x'):
+            self.logged_user.get(INDEX_URL + query)
+        new_hits, new_misses = fragment_stats('index_page')['index_page']
+        self.assertEqual(new_misses - misses, 1)
+        self.assertEqual(new_hits - hits, 3)
+
+    def test_index_switcher_follows_user(self):
+        """Переключатель лент виден только вошедшему, кто бы ни
+        закэшировал страницу первым"""
+        switcher = reverse('posts:follow_index')
+        for first, second in ((self.guest, self.logged_user),
+                              (self.logged_user, self.guest)):
+            with self.subTest(first_is_guest=first is self.guest):
+                cache.clear()
+                first.get(INDEX_URL)
+                response = second.get(INDEX_URL)
+                if second is self.guest:
+                    self.assertNotContains(response, switcher)
+                else:
+                    self.assertContains(response, switcher)
+
+    @override_settings(METRICS_FLUSH_INTERVAL=0)
+    def test_cache_stats_sees_other_processes(self):
+        """cache_stats показывает попадания, набранные другим процессом"""
+        reset()
+        cache.clear()
+        for _ in range(2):
+            self.logged_user.get(INDEX_URL)
+        # Команда запускается отдельным процессом со своими счётчиками.
+        reset()
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('index_page: попаданий 1, промахов 1', out.getvalue())
+
     def test_follow(self):
         """Тест подписки"""
         Follow.objects.all().delete()
@@ -147,6 +214,8 @@ class PostPaginatorTest(TestCase):
                           group=cls.group,
                           ) for id in range(cls.posts_count)]
         Post.objects.bulk_create(cls.posts)
+        # bulk_create обходит сигналы: счётчики чинятся, как после импорта.
+        call_command('reconcile_stats', stdout=StringIO())
 
     def test_paginator(self):
         """Тестирование пагинатора"""
@@ -161,3 +230,123 @@ class PostPaginatorTest(TestCase):
         for url, count in urls:
             self.assertEqual(len(
                 self.client.get(url).context['page_obj']), count)
+
+    def test_cursor_paginator(self):
+        """Курсор не сдвигается при появлении новых постов"""
+        first_page = self.client.get(INDEX_URL).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        Post.objects.create(text='Свежий пост', author=self.user)
+        next_page = self.client.get(
+            INDEX_URL + '?cursor=' + first_page.next_cursor
+        ).context['page_obj']
+        self.assertEqual(len(next_page), 1)
+        self.assertIsNone(next_page.next_cursor)
+        self.assertNotIn(next_page[0], list(first_page))
+        previous_page = self.client.get(
+            INDEX_URL + '?cursor=' + next_page.previous_cursor
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertIsNotNone(previous_page.previous_cursor)
+
+    @override_settings(PAGINATOR_WINDOW=1)
+    def test_page_window(self):
+        """Номера страниц выводятся только рядом с текущей"""
+        Post.objects.bulk_create(
+            Post(text=str(i), author=self.user)
+            for i in range(PAGINATOR_COUNT * 5))
+        cache.clear()
+        page = self.client.get(INDEX_URL + '?page=4').context['page_obj']
+        self.assertEqual(list(page.page_window), [3, 4, 5])
+        self.assertTrue(page.has_more)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(INDEX_URL + '?page=3')
+        self.assertFalse(
+            [query for query in queries if 'COUNT(' in query['sql']])
+
+    def test_count_follows_new_posts(self):
+        """Закэшированное число постов сбрасывается новыми постами"""
+        page = self.client.get(INDEX_URL).context['page_obj']
+        self.assertEqual(page.paginator.num_pages, 2)
+        for number in range(PAGINATOR_COUNT):
+            Post.objects.create(text=f'Новый пост {number}', author=self.user)
+        page = self.client.get(INDEX_URL).context['page_obj']
+        self.assertEqual(page.paginator.num_pages, 3)
+
+    def test_last_page_is_read_from_tail(self):
+        """Последняя страница открывается курсором без OFFSET"""
+        response = self.client.get(INDEX_URL)
+        last = '?cursor=' + response.context['page_obj'].paginator.last_cursor
+        self.assertContains(response, f'href="{last}"')
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(INDEX_URL + last).context['page_obj']
+        self.assertFalse(
+            [query for query in queries if 'OFFSET' in query['sql']])
+        self.assertEqual(
+            list(page),
+            list(Post.objects.order_by('-pub_date', '-id'))[
+                -PAGINATOR_COUNT:])
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNotNone(page.previous_cursor)
+
+    def test_broken_cursor_leads_to_first_page(self):
+        """Битый курсор ведёт на первую страницу"""
+        page = self.client.get(INDEX_URL + '?cursor=broken').context[
+            'page_obj']
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), PAGINATOR_COUNT)
+
+    def test_page_out_of_range_leads_to_last_page(self):
+        """Номер за последней страницей ведёт на последнюю"""
+        for url in (INDEX_URL, GROUP_URL, PROFILE_URL):
+            with self.subTest(url=url):
+                response = self.client.get(url + '?page=999')
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page_obj']
+                self.assertEqual(page.number, 2)
+                self.assertEqual(len(page), 1)
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER)
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+        for number in range(COMMENTS_PAGINATOR_COUNT + 1):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {number}')
+        cls.POST_DETAIL_URL = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.id})
+        cls.COMMENTS_URL = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.id})
+
+    def test_comments_count(self):
+        """Счётчик комментариев поста следует за комментариями"""
+        self.post.refresh_from_db()
+        self.assertEqual(
+            self.post.comments_count, COMMENTS_PAGINATOR_COUNT + 1)
+        Comment.objects.filter(post=self.post).first().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, COMMENTS_PAGINATOR_COUNT)
+
+    def test_post_with_comments_is_deleted_in_bulk(self):
+        """Удаление поста не обрабатывает комментарии по одному"""
+        post = Post.objects.create(text='Удаляемый пост', author=self.user)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user, text=f'Комментарий {number}')
+            for number in range(50))
+        with self.assertNumQueries(8):
+            post.delete()
+        self.assertFalse(Comment.objects.filter(post_id=post.id).exists())
+
+    def test_comments_are_paginated(self):
+        """Пост выводит первую страницу комментариев и ссылку на остальные"""
+        response = self.client.get(self.POST_DETAIL_URL)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PAGINATOR_COUNT)
+        self.assertContains(response, self.COMMENTS_URL + '?cursor=')
+        fragment = self.client.get(
+            self.COMMENTS_URL + '?cursor=' + comments.next_cursor)
+        self.assertEqual(len(fragment.context['comments']), 1)
+        self.assertContains(fragment, 'Комментарий 0')
+        self.assertNotContains(fragment, self.COMMENTS_URL)
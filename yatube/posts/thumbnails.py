@@ -0,0 +1,352 @@
+"""Миниатюры картинок постов, подготовленные заранее.
+
+Шаблоны не вызывают {% thumbnail %}: он декодирует и масштабирует
+картинку прямо в запросе первого зрителя. Все размеры, которые выводят
+шаблоны, объявлены в THUMBNAILS и генерируются пулом процессов после
+сохранения поста (и командой pregenerate_thumbnails для старых постов),
+а шаблон только ищет готовую миниатюру в KV-хранилище sorl и без неё
+показывает заглушку. Рядом с каждой миниатюрой воркер пишет её варианты
+в современных форматах.
+
+Воркер работает только с файлами. Записи в KV-хранилище и отметки у
+постов делает родительский процесс, когда задача готова: кэш у воркера
+свой, и сброшенные им версии страниц веб-процесс бы не увидел.
+"""
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import worker
+from .cache import bump_content_generation
+from .feed import invalidate_feeds
+from .images import (VARIANT_TYPES, read_metadata, variant_name,
+                     write_variants)
+from .models import Follow, Post
+from .surrogate import INDEX, author_key, group_key, post_key, purge
+
+logger = logging.getLogger('yatube.thumbnails')
+
+# Имя размера: (геометрия, параметры sorl). Картинка вписывается в
+# квадрат без обрезки, поэтому пропорции карточки — пропорции картинки.
+THUMBNAILS = {
+    'card': ('960x960', {'upscale': True}),
+    'card_small': ('480x480', {'upscale': True}),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    def full_options(self, source, options):
+        """Параметры миниатюры, дополненные так же, как в get_thumbnail():
+        от них зависит имя файла миниатюры."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile миниатюры без обращения к KV-хранилищу."""
+        source = ImageFile(file_)
+        options = self.full_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+backend = LookupBackend()
+
+
+def _lookup_raw(keys):
+    """Значения KV-хранилища по ключам: одним get_many из кэша и одним
+    запросом к базе для промахов.
+
+    Отсутствие миниатюры кэшируется ненадолго (THUMBNAIL_MISS_TIMEOUT):
+    страница не ходит в базу на каждый запрос, но и не прячет миниатюру,
+    которую воркер создал в другом процессе.
+    """
+    kvstore = default.kvstore
+    found = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        loaded = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        kvstore.cache.set_many(
+            loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        kvstore.cache.set_many(
+            {key: cached_db_kvstore.EMPTY_VALUE
+             for key in missing if key not in loaded},
+            settings.THUMBNAIL_MISS_TIMEOUT)
+        found.update(loaded)
+    return {key: value for key, value in found.items()
+            if value != cached_db_kvstore.EMPTY_VALUE}
+
+
+def resolve_sizes(images, sizes):
+    """Готовые миниатюры картинок во всех размерах одним поиском:
+    {размер: {имя картинки: ImageFile или None}}."""
+    # Ключ sorl зависит и от хранилища картинки: ищем по имени в
+    # хранилище sorl, как картинку передаёт воркер.
+    names = [getattr(image, 'name', image) for image in images if image]
+    files = {
+        size: {name: backend.thumbnail_file(
+            name, THUMBNAILS[size][0], **THUMBNAILS[size][1])
+            for name in names}
+        for size in sizes
+    }
+    if not isinstance(default.kvstore, cached_db_kvstore.KVStore):
+        return {size: {name: default.kvstore.get(thumbnail)
+                       for name, thumbnail in thumbnails.items()}
+                for size, thumbnails in files.items()}
+    keys = {size: {name: add_prefix(thumbnail.key)
+                   for name, thumbnail in thumbnails.items()}
+            for size, thumbnails in files.items()}
+    found = _lookup_raw(list({
+        key for size_keys in keys.values() for key in size_keys.values()}))
+    return {
+        size: {name: deserialize_image_file(found[key])
+               if key in found else None
+               for name, key in size_keys.items()}
+        for size, size_keys in keys.items()
+    }
+
+
+def resolve_thumbnails(images, size):
+    """Готовые миниатюры картинок: {имя картинки: ImageFile или None}."""
+    return resolve_sizes(images, [size])[size]
+
+
+def attach_thumbnails(posts, *sizes):
+    """Разом находит миниатюры картинок постов и кладёт их в
+    post.thumbnails = {размер: ImageFile или None}."""
+    posts = [post for post in posts if post.image]
+    resolved = resolve_sizes(
+        [post.image for post in posts], sizes or list(THUMBNAILS))
+    for post in posts:
+        post.thumbnails = {
+            size: thumbnails.get(post.image.name)
+            for size, thumbnails in resolved.items()
+        }
+    return posts
+
+
+def cached_thumbnail(image, size):
+    """Готовая миниатюра одной картинки или None, без генерации."""
+    return resolve_thumbnails([image], size).get(
+        getattr(image, 'name', image))
+
+
+def render_thumbnails(name):
+    """Создаёт файлы всех объявленных миниатюр картинки и их варианты в
+    современных форматах, не обращаясь ни к базе, ни к кэшу.
+
+    Возвращает сериализованные картинку и миниатюры с размерами и
+    форматы, которые есть у всех миниатюр, — для store_thumbnails(). Для
+    картинки, которой нет в хранилище или чьё имя ведёт за его пределы,
+    возвращает None.
+    """
+    try:
+        if not default_storage.exists(name):
+            return None
+    except SuspiciousFileOperation:
+        return None
+    source = ImageFile(name, default.storage)
+    source_image = None
+    thumbnails, formats = [], None
+    try:
+        for geometry, options in THUMBNAILS.values():
+            options = backend.full_options(source, options)
+            thumbnail = backend.thumbnail_file(name, geometry, **options)
+            if not thumbnail.exists():
+                if source_image is None:
+                    source_image = default.engine.get_image(source)
+                    source.set_size(
+                        default.engine.get_image_size(source_image))
+                options['image_info'] = default.engine.get_image_info(
+                    source_image)
+                backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail)
+                backend._create_alternative_resolutions(
+                    source_image, geometry, options, thumbnail.name)
+            thumbnail.set_size()
+            written = write_variants(thumbnail.name, default.storage)
+            formats = written if formats is None else [
+                image_format for image_format in formats
+                if image_format in written]
+            thumbnails.append(serialize_image_file(thumbnail))
+    finally:
+        if source_image is not None:
+            default.engine.cleanup(source_image)
+    source.set_size()
+    return serialize_image_file(source), thumbnails, formats
+
+
+def store_thumbnails(name, rendered):
+    """Записывает миниатюры из render_thumbnails() в KV-хранилище и
+    отмечает их у постов; возвращает число миниатюр."""
+    if rendered is None:
+        return 0
+    source, thumbnails, formats = rendered
+    source = default.kvstore.get_or_set(deserialize_image_file(source))
+    for thumbnail in thumbnails:
+        default.kvstore.set(deserialize_image_file(thumbnail), source)
+    record_image(name, formats)
+    purge_image_pages(name)
+    return len(thumbnails)
+
+
+def generate_thumbnails(name):
+    """Создаёт миниатюры картинки в текущем процессе."""
+    return store_thumbnails(name, render_thumbnails(name))
+
+
+def record_image(name, formats):
+    """Отмечает у постов с картинкой готовые варианты миниатюр, а постам,
+    сохранённым мимо PostForm, дописывает размеры и цвет заглушки.
+
+    Вызывается в процессе, который обслуживает запросы или запустил
+    команду: сохранение через save(update_fields=...) проходит через
+    сигналы, и версии страниц и лент, где пост выводился без миниатюр,
+    меняются в том кэше, который читают страницы.
+    """
+    value = ','.join(formats)
+    posts = Post.objects.filter(image=name).filter(
+        ~Q(image_formats=value) | Q(image_width__isnull=True))
+    metadata = None
+    for post in posts:
+        post.image_formats = value
+        fields = ['image_formats']
+        if post.image_width is None:
+            if metadata is None:
+                with default_storage.open(name) as file:
+                    metadata = read_metadata(file)
+            for field, field_value in metadata.items():
+                setattr(post, field, field_value)
+            fields.extend(metadata)
+        post.save(update_fields=fields)
+
+
+def purge_image_pages(*names):
+    """Сбрасывает страницы и ленты с постами, у которых картинка из names.
+
+    Они могли закэшироваться с заглушкой, а record_image() сохраняет
+    пост, только если ему есть что дописать: картинку, которую уже
+    отметили у другого поста, он не трогает.
+    """
+    rows = list(Post.objects.filter(image__in=names).values_list(
+        'pk', 'author_id', 'group__slug'))
+    if not rows:
+        return
+    keys = {INDEX}
+    for post_id, author_id, slug in rows:
+        keys.update((post_key(post_id), author_key(author_id)))
+        if slug:
+            keys.add(group_key(slug))
+    purge(*keys)
+    bump_content_generation()
+    invalidate_feeds(set(Follow.objects.filter(
+        author_id__in={row[1] for row in rows}).values_list(
+        'user_id', flat=True)))
+
+
+def delete_thumbnails(name):
+    """Удаляет миниатюры картинки, их варианты и записи о них в
+    KV-хранилище; саму картинку не трогает."""
+    for geometry, options in THUMBNAILS.values():
+        thumbnail = backend.thumbnail_file(name, geometry, **options)
+        for image_format in VARIANT_TYPES:
+            default.storage.delete(variant_name(thumbnail.name, image_format))
+        default.storage.delete(thumbnail.name)
+    delete(name, delete_file=False)
+
+
+def pool(workers=None):
+    """Пул процессов для генерации. Процессы запускаются через spawn:
+    они не наследуют соединения с базой родителя. Инициализатор
+    вызывает django.setup: этот модуль импортирует модели и до настройки
+    приложений в процессе-воркере не загрузится."""
+    return ProcessPoolExecutor(
+        max_workers=workers or settings.THUMBNAIL_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=worker.init,
+        initargs=(settings.MEDIA_ROOT,),
+    )
+
+
+def _store_result(name, submitter, retries, future):
+    """Колбэк задачи пула: выполняется в служебном потоке пула в
+    родительском процессе, а если задача уже готова — сразу в потоке,
+    который её поставил."""
+    error = future.exception()
+    if isinstance(error, BrokenProcessPool) and retries:
+        # Воркер упал, пока задача ждала очереди или выполнялась.
+        _submit(name, retries - 1)
+        return
+    if error is not None:
+        logger.error('Миниатюры не созданы', exc_info=error)
+        return
+    try:
+        store_thumbnails(name, future.result())
+    except Exception:
+        logger.exception('Миниатюры %s не записаны', name)
+    finally:
+        if threading.get_ident() != submitter:
+            # Соединение служебного потока само не закроется.
+            connection.close()
+
+
+def _submit(name, retries=1):
+    """Отдаёт картинку пулу. Сломанный пул, в котором умер воркер,
+    создаётся заново, и задача ставится ещё retries раз."""
+    global _pool
+    if not settings.THUMBNAIL_WORKERS:
+        generate_thumbnails(name)
+        return
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool()
+        executor = _pool
+    try:
+        future = executor.submit(render_thumbnails, name)
+    except BrokenProcessPool:
+        with _pool_lock:
+            if _pool is executor:
+                _pool = None
+        executor.shutdown(wait=False)
+        if not retries:
+            logger.exception('Пул миниатюр сломан, %s пропущена', name)
+            return
+        logger.warning('Пул миниатюр сломан, он будет создан заново')
+        _submit(name, retries - 1)
+        return
+    future.add_done_callback(functools.partial(
+        _store_result, name, threading.get_ident(), retries))
+
+
+def schedule_thumbnails(name):
+    """Ставит генерацию миниатюр в пул после коммита транзакции."""
+    transaction.on_commit(lambda: _submit(name))
@@ -1,8 +1,9 @@
 from django.urls import path
 
 from .views import (index, group_posts, post_edit, profile,
-                    post_detail, post_create, add_comment,
-                    follow_index, profile_follow, profile_unfollow)
+                    post_detail, post_create, add_comment, post_comments,
+                    follow_index, profile_follow, profile_unfollow,
+                    search, search_json)
 
 app_name = 'posts'
 
@@ -14,6 +15,10 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', post_edit, name='post_edit'),
     path('posts/<int:post_id>/', post_detail, name='post_detail'),
     path('posts/<int:post_id>/comment/', add_comment, name='add_comment'),
+    path('posts/<int:post_id>/comments/', post_comments,
+         name='post_comments'),
+    path('search/', search, name='search'),
+    path('search.json', search_json, name='search_json'),
     path('follow/', follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          profile_follow,
@@ -1,54 +1,190 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Max
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 
-from yatube.settings import PAGINATOR_COUNT
+from core.query_budget import query_budget
+from yatube.settings import (COMMENTS_PAGINATOR_COUNT, FEED_CACHE_TIMEOUT,
+                             PAGINATOR_COUNT)
+from .cache import get_content_generation
+from .feed import feed_posts, feed_version
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Comment, Follow, Group, Post, User
+from .paginators import KeysetPaginator
+from .search import search_posts
+from .stats import stats_for
+from .surrogate import (GROUPS, INDEX, author_key, feed_key, group_key,
+                        post_key, surrogate_keys)
+from .thumbnails import attach_thumbnails
 
 
-def post_paginator(posts, request):
-    paginator = Paginator(posts, PAGINATOR_COUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def post_paginator(posts, request, date_field='pub_date', key_field='id'):
+    paginator = KeysetPaginator(
+        posts, PAGINATOR_COUNT, date_field=date_field, key_field=key_field)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        page = paginator.get_cursor_page(cursor)
+    else:
+        page = paginator.get_page(request.GET.get('page'))
+    attach_thumbnails(page)
+    return page
 
 
+def comment_paginator(post, request):
+    paginator = KeysetPaginator(
+        post.comments.select_related('author'), COMMENTS_PAGINATOR_COUNT,
+        date_field='created', count=post.comments_count)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
+    return paginator.get_page(1)
+
+
+def index_keys(request):
+    return [INDEX]
+
+
+def group_keys(request, slug):
+    return [group_key(slug), GROUPS]
+
+
+def profile_keys(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return author_id and [author_key(author_id), GROUPS]
+
+
+def post_detail_keys(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    return author_id and [post_key(post_id), author_key(author_id), GROUPS]
+
+
+def follow_keys(request):
+    return [feed_key(request.user.id), GROUPS]
+
+
+def last_modified(posts, comments=None):
+    """Дата самого нового поста или комментария для Last-Modified.
+    Комментарии выводит только страница поста, у списков постов их нет."""
+    dates = [posts.aggregate(date=Max('pub_date'))['date']]
+    if comments is not None:
+        dates.append(comments.aggregate(date=Max('created'))['date'])
+    return max((date for date in dates if date), default=None)
+
+
+def index_modified(request):
+    return last_modified(Post.objects.all())
+
+
+def group_modified(request, slug):
+    return last_modified(Post.objects.filter(group__slug=slug))
+
+
+def profile_modified(request, username):
+    return last_modified(Post.objects.filter(author__username=username))
+
+
+def post_detail_modified(request, post_id):
+    return last_modified(
+        Post.objects.filter(pk=post_id),
+        Comment.objects.filter(post_id=post_id))
+
+
+@surrogate_keys(index_keys, last_modified_func=index_modified)
+@query_budget(4)
 def index(request):
     return render(request, 'posts/index.html', {
-        'page_obj': post_paginator(Post.objects.all(), request)})
+        'page_obj': post_paginator(Post.objects.for_listing(), request),
+        'content_generation': get_content_generation(),
+    })
 
 
+@surrogate_keys(group_keys, last_modified_func=group_modified)
+@query_budget(5)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     context = {
         'group': group,
-        'page_obj': post_paginator(group.posts.all(), request),
+        'page_obj': post_paginator(group.posts.for_listing(), request),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@surrogate_keys(profile_keys, last_modified_func=profile_modified)
+@query_budget(6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    following = request.user.is_authenticated and request.user != author and (
-        Follow.objects.filter(user=request.user, author=author).exists())
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
     context = {
         'author': author,
-        'page_obj': post_paginator(author.post.all(), request),
-        'following': following,
+        'page_obj': post_paginator(author.post.for_listing(), request),
+        'stats': stats_for(author),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@surrogate_keys(post_detail_keys, last_modified_func=post_detail_modified)
+@query_budget(4)
 def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.for_listing().select_related('author__stats'),
+        id=post_id)
     context = {
-        'post': get_object_or_404(Post, id=post_id),
-        'form': CommentForm(request.POST or None),
+        'post': post,
+        'stats': stats_for(post.author),
+        'comments': comment_paginator(post, request),
     }
     return render(
         request, 'posts/post_detail.html', context)
 
 
+@query_budget(2)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post, id=post_id)
+    return render(request, 'posts/includes/comment_list.html', {
+        'post': post,
+        'comments': comment_paginator(post, request),
+    })
+
+
+def search_page(request):
+    query = request.GET.get('q', '').strip()
+    return query, search_posts(
+        query, PAGINATOR_COUNT, request.GET.get('cursor'))
+
+
+@query_budget(2)
+def search(request):
+    query, page = search_page(request)
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': page,
+    })
+
+
+@query_budget(2)
+def search_json(request):
+    query, page = search_page(request)
+    return JsonResponse({
+        'query': query,
+        'results': [{
+            'id': post.id,
+            'url': reverse('posts:post_detail', args=[post.id]),
+            'author': post.author.username,
+            'group': post.group and post.group.slug,
+            'pub_date': post.pub_date.isoformat(),
+            'snippet': post.snippet,
+            'rank': post.search_rank,
+        } for post in page],
+        'next_cursor': page.next_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
@@ -94,15 +230,20 @@ def add_comment(request, post_id):
 
 
 @login_required
+@surrogate_keys(follow_keys, shared=False)
+@query_budget(2)
 def follow_index(request):
     return render(request, 'posts/follow.html', {
-        'page_obj': post_paginator(Post.objects.filter(
-            author__following__user=request.user),
-            request)
+        'page_obj': post_paginator(
+            feed_posts(request.user).for_listing(), request,
+            date_field='feed_date', key_field='feed_post'),
+        'feed_version': feed_version(request.user.id),
+        'cache_timeout': FEED_CACHE_TIMEOUT,
     })
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     if username != request.user.username:
         Follow.objects.get_or_create(
@@ -112,6 +253,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     get_object_or_404(
         Follow,
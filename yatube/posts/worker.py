@@ -0,0 +1,14 @@
+"""Инициализатор процессов пула миниатюр.
+
+Воркер импортирует его до настройки Django, поэтому модуль не тянет
+за собой модели, в отличие от posts.thumbnails.
+"""
+import django
+from django.conf import settings
+
+
+def init(media_root):
+    django.setup()
+    # Настройки воркер читает заново; MEDIA_ROOT берётся у родителя,
+    # чтобы файлы легли туда, где их ищет он.
+    settings.MEDIA_ROOT = media_root
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -45,11 +46,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -59,7 +63,9 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.InstrumentedTemplates',
+        # без имени движок назывался бы по модулю бэкенда, metrics
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,6 +83,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
@@ -122,6 +130,101 @@ USE_L10N = True
 USE_TZ = True
 
 PAGINATOR_COUNT = 10
+# сколько соседних номеров страниц показывать и как долго кэшировать
+# общее число записей в пагинаторе
+PAGINATOR_WINDOW = 3
+PAGINATOR_COUNT_TIMEOUT = 60 * 5
+COMMENTS_PAGINATOR_COUNT = 20
+
+# сколько последних записей хранится в ленте подписок пользователя
+FEED_MAX_LENGTH = 1000
+# фрагмент ленты сбрасывается сменой версии, поэтому TTL может быть долгим
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# целые страницы постов для анонимов; страница сбрасывается по её
+# суррогатным ключам, TTL лишь вытесняет давно не читанные
+PAGE_CACHE_ENABLED = not DEBUG
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# заголовок Server-Timing с временем SQL, шаблонов и всего запроса
+SERVER_TIMING = True
+# каталог, куда каждый процесс пишет свои метрики, и как часто он это
+# делает, секунды; /metrics складывает файлы всех процессов, поэтому
+# каталог должен быть общим для всех процессов сервера
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics'))
+METRICS_FLUSH_INTERVAL = 10
+# секрет, с которым Prometheus читает /metrics без входа на сайт:
+# заголовок Authorization: Bearer <токен> (bearer_token в scrape_config);
+# None — /metrics видят только сотрудники
+METRICS_TOKEN = None
+# пик памяти и места выделения каждого запроса по tracemalloc; заметно
+# замедляет процесс, поэтому включается на время поиска утечки
+MEMORY_TRACING = False
+MEMORY_TRACE_FRAMES = 1
+MEMORY_TOP_SITES = 10
+# запрос с большим пиком, байты, отмечается в логе yatube.memory
+MEMORY_BUDGET = 64 * 1024 * 1024
+
+# превышение бюджета SQL-запросов view: исключение вместо записи в лог
+QUERY_BUDGET_ENFORCE = False
+
+# SQL-запросы дольше стольких секунд пишутся в журнал медленных запросов
+# с view и строкой шаблона; None — не писать
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.log')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# куда ProfilingMiddleware кладёт профили: запрос сотрудника с
+# ?profile=1 или X-Profile: 1 к view из PROFILE_APPS
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_APPS = ('posts', 'users', 'about')
+# непрерывное сэмплирование стеков запросов по view; раз в окно стеки
+# сбрасываются в файл PROFILE_DIR
+PROFILE_SAMPLING = False
+PROFILE_SAMPLE_INTERVAL = 0.01
+PROFILE_SAMPLE_WINDOW = 60
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.slow_queries.JsonFormatter'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': SLOW_QUERY_LOG_MAX_BYTES,
+            'backupCount': SLOW_QUERY_LOG_BACKUPS,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# процессы, которые готовят миниатюры после сохранения поста;
+# 0 — генерировать сразу после коммита в текущем процессе
+THUMBNAIL_WORKERS = 2
+# как долго помнить, что миниатюры ещё нет, прежде чем искать её снова
+THUMBNAIL_MISS_TIMEOUT = 60
+
+# загруженная картинка уменьшается до этого размера по большей стороне
+# и перекодируется в JPEG; миниатюры дополняются вариантами в форматах,
+# которые умеет сохранять Pillow
+IMAGE_MAX_SIZE = 2048
+IMAGE_JPEG_QUALITY = 82
+IMAGE_VARIANT_FORMATS = ('avif', 'webp')
+IMAGE_VARIANT_QUALITY = 70
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
@@ -135,6 +238,27 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# картинку, которую переиспользовали за последние столько секунд, не
+# удаляем: ссылающийся на неё пост может быть ещё не закоммичен
+MEDIA_RELEASE_GRACE = 300
+
+# как отдавать MEDIA_ROOT: без MEDIA_SENDFILE в окружении — из Django,
+# 'x-accel-redirect' — через internal-location nginx с префиксом
+# MEDIA_ACCEL_PREFIX, 'x-sendfile' — заголовком X-Sendfile (Apache,
+# lighttpd). Для nginx нужен location, недоступный снаружи:
+#     location /protected-media/ {
+#         internal;
+#         alias /path/to/yatube/media/;
+#     }
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_ACCEL_PREFIX = os.environ.get(
+    'MEDIA_ACCEL_PREFIX', '/protected-media/')
+# сколько секунд клиент кэширует файлы с изменяемыми именами; файлы с
+# хэшем содержимого в имени (картинки постов и миниатюры) кэшируются
+# навсегда
+MEDIA_MAX_AGE = 60 * 60
+MEDIA_IMMUTABLE_RE = r'^(posts|cache)/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32,}\.'
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'post:index'
 # LOGOUT_REDIRECT_URL = 'post:index'
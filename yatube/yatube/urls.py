@@ -1,10 +1,15 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.media import serve_media
+from core.metrics import metrics
+from core.views import slow_queries
+
 urlpatterns = [
+    path('admin/slow-queries/', slow_queries, name='slow_queries'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('auth/', include('users.urls', namespace='users')),
     path('about/', include('about.urls', namespace='about')),
     path('auth/', include('django.contrib.auth.urls')),
@@ -14,7 +19,7 @@ handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'
 handler500 = 'core.views.server_error'
 
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+urlpatterns += [
+    path(settings.MEDIA_URL.lstrip('/') + '<path:path>', serve_media,
+         name='media'),
+]